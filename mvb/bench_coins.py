@@ -0,0 +1,59 @@
+'''Compares the stored size of outputs as raw TxOut.serialize() bytes
+against the compressed Coin serialization.
+
+Run from this directory: python bench_coins.py [count]
+'''
+import random
+import sys
+
+from s256 import G
+from script import Script, p2pkh_script, p2sh_script
+from tx import TxOut
+from utxo import Coin
+
+
+def random_script(rng):
+    '''ScriptPubKey drawn from a rough mix of what the UTXO set holds'''
+    kind = rng.random()
+    if kind < 0.55:
+        return p2pkh_script(rng.randbytes(20))
+    elif kind < 0.75:
+        return p2sh_script(rng.randbytes(20))
+    elif kind < 0.93:
+        # p2wpkh
+        return Script([0x00, rng.randbytes(20)])
+    elif kind < 0.97:
+        # p2wsh
+        return Script([0x00, rng.randbytes(32)])
+    else:
+        point = rng.randint(1, 2**32) * G
+        return Script([point.sec(compressed=rng.random() < 0.5), 0xac])
+
+
+def random_amount(rng):
+    '''Mostly arbitrary amounts with a good share of round ones'''
+    if rng.random() < 0.3:
+        return rng.randint(1, 1000) * 10**rng.randint(3, 8)
+    return rng.randint(546, 10**9)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(21000000)
+    raw_total = 0
+    compressed_total = 0
+    for _ in range(count):
+        tx_out = TxOut(random_amount(rng), random_script(rng))
+        height = rng.randint(0, 800000)
+        coin = Coin.from_tx_out(tx_out, height, rng.random() < 0.01)
+        # raw output plus 4 bytes of height/coinbase
+        raw_total += len(tx_out.serialize()) + 4
+        compressed_total += len(coin.serialize())
+    print('{} outputs'.format(count))
+    print('raw         {:8.2f} bytes/output'.format(raw_total / count))
+    print('compressed  {:8.2f} bytes/output'.format(compressed_total / count))
+    print('saved       {:8.1f}%'.format(100 * (1 - compressed_total / raw_total)))
+
+
+if __name__ == '__main__':
+    main()
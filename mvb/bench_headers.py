@@ -0,0 +1,60 @@
+'''Times opening a HeaderStore, building its hash index and columnar
+analytics over it, then validating a header chain of the same length.
+
+Run from this directory: python bench_headers.py [count] [workers]
+'''
+import os
+import sys
+import tempfile
+import time
+
+from fixtures import REGTEST_MAX_TARGET, make_chain, make_headers
+from headerchain import HeaderChainValidator
+from headerstats import HeaderColumns
+from headerstore import HeaderStore
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 800000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as directory:
+        store = HeaderStore(directory)
+        start = time.perf_counter()
+        batch = 10000
+        for i in range(0, count, batch):
+            prev_block = store.tip() or b'\x00' * 32
+            store.append_many(
+                [block.serialize() for block in make_headers(min(batch, count - i), prev_block)])
+        store.close()
+        print('wrote {} headers in {:.2f}s'.format(count, time.perf_counter() - start))
+        start = time.perf_counter()
+        store = HeaderStore(directory)
+        opened = time.perf_counter() - start
+        tip = store.tip()
+        store.height_of(tip)
+        indexed = time.perf_counter() - start
+        print('open        {:.3f}s'.format(opened))
+        print('hash index  {:.3f}s'.format(indexed))
+        start = time.perf_counter()
+        for height in range(0, count, 997):
+            store.get(height)
+        print('get         {:.2f}us/header'.format(
+            (time.perf_counter() - start) / len(range(0, count, 997)) * 1e6))
+        start = time.perf_counter()
+        columns = HeaderColumns.from_store(store)
+        columns.window_counts(columns.signalling(1))
+        columns.retargets()
+        columns.interval_stats()
+        print('columnar    {:.3f}s signalling, retargets and intervals'.format(
+            time.perf_counter() - start))
+        store.close()
+    headers = make_chain(count)
+    validator = HeaderChainValidator(workers=workers, max_target=REGTEST_MAX_TARGET)
+    start = time.perf_counter()
+    validator.check(headers, now=time.time() + 600 * count)
+    print('validate    {:.2f}s with {} workers'.format(time.perf_counter() - start, workers))
+    validator.close()
+
+
+if __name__ == '__main__':
+    main()
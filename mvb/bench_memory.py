@@ -0,0 +1,43 @@
+'''Measures the resident bytes per parsed transaction.
+
+Run from this directory: python bench_memory.py [count]
+'''
+import sys
+import tracemalloc
+from io import BytesIO
+
+from tx import LazyTx, Tx
+
+RAW_TX = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+
+
+def bytes_per_tx(parse, count, touch=False):
+    '''Parses count copies of RAW_TX and returns the traced bytes per tx'''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    txs = []
+    for _ in range(count):
+        tx = parse(BytesIO(RAW_TX))
+        if touch:
+            # force every input, output and script to be decoded
+            for tx_in in tx.tx_ins:
+                tx_in.script_sig.cmds
+            for tx_out in tx.tx_outs:
+                tx_out.script_pubkey.cmds
+        txs.append(tx)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return total / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print('{} txs of {} bytes'.format(count, len(RAW_TX)))
+    print('Tx.parse              {:8.1f} bytes/tx'.format(bytes_per_tx(Tx.parse, count)))
+    print('LazyTx.parse          {:8.1f} bytes/tx'.format(bytes_per_tx(LazyTx.parse, count)))
+    print('LazyTx.parse, decoded {:8.1f} bytes/tx'.format(bytes_per_tx(LazyTx.parse, count, touch=True)))
+
+
+if __name__ == '__main__':
+    main()
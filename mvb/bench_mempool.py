@@ -0,0 +1,56 @@
+'''Reports the mempool accept rate, with and without script checks.
+
+Run from this directory: python bench_mempool.py [unsigned] [signed]
+'''
+import sys
+
+from mempool import Mempool
+from prevout import DictPrevouts
+from s256 import PrivateKey
+from script import p2pkh_script
+from tx import Tx, TxIn, TxOut
+
+
+def make_txs(count, private_key, sign):
+    '''Returns a confirmed funding DictPrevouts and count txs spending it,
+    every third one spending the tx before it instead'''
+    script_pubkey = p2pkh_script(private_key.point.hash160())
+    funding = Tx(1, [TxIn(b'\x01' * 32, 0)], [TxOut(100000000, script_pubkey)] * count, 0)
+    confirmed = DictPrevouts()
+    confirmed.add_tx(funding)
+    prevouts = DictPrevouts()
+    prevouts.add_tx(funding)
+    funding_hash = funding.hash()
+    txs = []
+    for i in range(count):
+        if i % 3 == 2:
+            tx_in = TxIn(txs[-1].hash(), 0)
+            amount = txs[-1].tx_outs[0].amount
+        else:
+            tx_in = TxIn(funding_hash, i)
+            amount = 100000000
+        tx = Tx(1, [tx_in], [TxOut(amount - 1000 - i, script_pubkey)], 0)
+        if sign:
+            tx.sign_input(0, private_key, prevouts=prevouts)
+            prevouts.add_tx(tx)
+        txs.append(tx)
+    return confirmed, txs
+
+
+def run(count, sign):
+    confirmed, txs = make_txs(count, PrivateKey(8675309), sign)
+    mempool = Mempool(confirmed, verify=sign)
+    for tx in txs:
+        mempool.add(tx)
+    stats = mempool.stats()
+    print('{} txs {} script checks: {:.0f} tx/s'.format(
+        stats['accepted'], 'with' if sign else 'without', stats['accept_rate']))
+
+
+def main():
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000, sign=False)
+    run(int(sys.argv[2]) if len(sys.argv) > 2 else 100, sign=True)
+
+
+if __name__ == '__main__':
+    main()
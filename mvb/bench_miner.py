@@ -0,0 +1,49 @@
+'''Reports the hashrate of the CPU miner on a target nothing will meet
+and how long a block template takes to roll its extranonce.
+
+Run from this directory: python bench_miner.py [workers] [hashes]
+'''
+import os
+import sys
+import time
+
+from block import Block
+from fixtures import make_txs
+from helper import merkle_root
+from miner import Miner
+from script import p2pkh_script
+from template import BlockTemplate
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    hashes = int(sys.argv[2]) if len(sys.argv) > 2 else 2**21
+    # mainnet's lowest difficulty, out of reach at these hashrates
+    block = Block(0x20000000, b'\x11' * 32, b'\x22' * 32, 1296688602,
+                  bytes.fromhex('ffff001d'), bytes(4))
+    miner = Miner(workers=workers, chunk_size=2**18)
+    try:
+        miner.mine(block, max_hashes=hashes)
+    finally:
+        miner.close()
+    stats = miner.stats()
+    print('{} hashes in {:.2f}s with {} workers: {:.0f} H/s'.format(
+        stats['hashes'], stats['seconds'], workers, stats['hashrate']))
+    template = BlockTemplate(0x20000000, b'\x11' * 32, 1296688602, block.bits, 1,
+                             make_txs(4000), 50 * 100000000, p2pkh_script(b'\x00' * 20))
+    start = time.perf_counter()
+    for extranonce in range(1000):
+        template.header(extranonce)
+    rolled = (time.perf_counter() - start) / 1000
+    hashes = [tx.hash()[::-1] for tx in template.txs]
+    start = time.perf_counter()
+    for extranonce in range(10):
+        coinbase = template.make_coinbase(extranonce)
+        merkle_root([coinbase.hash()[::-1]] + hashes)
+    rebuilt = (time.perf_counter() - start) / 10
+    print('extranonce roll with 4001 txs: {:.1f}us, {:.1f}us rebuilding the tree'.format(
+        rolled * 1e6, rebuilt * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+'''Times building a block template from a large candidate pool.
+
+Run from this directory: python bench_template.py [candidates]
+'''
+import random
+import sys
+
+from helper import hash256
+from script import p2pkh_script
+from template import TemplateBuilder
+from tx import Tx, TxIn, TxOut
+
+
+def make_candidates(count, seed=1):
+    '''Returns count (tx, fee) pairs, a third of them in chains of up to
+    five transactions'''
+    rng = random.Random(seed)
+    script_pubkey = p2pkh_script(b'\x00' * 20)
+    candidates = []
+    parent = None
+    for i in range(count):
+        if parent is not None and rng.random() < 0.33 and i % 5:
+            prev_tx = parent.hash()
+        else:
+            prev_tx = hash256(i.to_bytes(4, 'little'))
+        tx = Tx(1, [TxIn(prev_tx, 0)], [TxOut(10000, script_pubkey)], 0)
+        candidates.append((tx, rng.randint(100, 100000)))
+        parent = tx
+    return candidates
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    candidates = make_candidates(count)
+    template, report = TemplateBuilder().build(
+        candidates, b'\x11' * 32, 1, bytes.fromhex('ffff7f20'), 1296688602,
+        p2pkh_script(b'\x01' * 20))
+    print('{} candidates: {} txs, {} sat fees, weight {}, selected in {:.2f}s'.format(
+        count, report['txs'], report['fees'], report['weight'], report['seconds']))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,20 +3,25 @@ from unittest import TestCase
 
 from helper import (
     bits_to_target,
+    encode_varint,
     hash256,
     int_to_little_endian,
     little_endian_to_int,
     merkle_root,
+    read_varint,
 )
+from tx import LazyTx, Tx
 
 GENESIS_BLOCK = bytes.fromhex('0100000000000000000000000000000000000000000000000000000000000000000000003ba3edfd7a7b12b27ac72c3e67768f617fc81bc3888a51323a9fb8aa4b1e5e4a29ab5f49ffff001d1dac2b7c')
 TESTNET_GENESIS_BLOCK = bytes.fromhex('0100000000000000000000000000000000000000000000000000000000000000000000003ba3edfd7a7b12b27ac72c3e67768f617fc81bc3888a51323a9fb8aa4b1e5e4adae5494dffff001d1aa4ae18')
 LOWEST_BITS = bytes.fromhex('ffff001d')
 
 class Block:
+    __slots__ = ('version', 'prev_block', 'merkle_root', 'timestamp', 'bits',
+                 'nonce', 'tx_hashes', 'txs')
 
     def __init__(self, version, prev_block, merkle_root,
-                 timestamp, bits, nonce, tx_hashes=None):
+                 timestamp, bits, nonce, tx_hashes=None, txs=None):
         self.version = version
         self.prev_block = prev_block
         self.merkle_root = merkle_root
@@ -24,6 +29,7 @@ class Block:
         self.bits = bits
         self.nonce = nonce
         self.tx_hashes = tx_hashes
+        self.txs = txs
 
     @classmethod
     def parse(cls, s):
@@ -44,6 +50,26 @@ class Block:
         # initialize class
         return cls(version, prev_block, merkle_root, timestamp, bits, nonce)
 
+    @classmethod
+    def parse_full(cls, s, testnet=False, lazy=False):
+        '''Takes a byte stream and parses a block with all of its
+        transactions. Returns a Block object with txs and tx_hashes set'''
+        block = cls.parse(s)
+        block.txs = list(block.iter_txs(s, testnet=testnet, lazy=lazy))
+        return block
+
+    def iter_txs(self, s, testnet=False, lazy=False):
+        '''Reads the transaction count and yields the transactions that
+        follow the header in the stream one at a time. Each hash is added to
+        self.tx_hashes, so validate_merkle_root works once it's exhausted'''
+        parser = LazyTx if lazy else Tx
+        self.tx_hashes = []
+        num_txs = read_varint(s)
+        for _ in range(num_txs):
+            tx = parser.parse(s, testnet=testnet)
+            self.tx_hashes.append(tx.hash())
+            yield tx
+
     def serialize(self):
         '''Returns the 80 byte block header'''
         # version - 4 bytes, little endian
@@ -60,6 +86,15 @@ class Block:
         result += self.nonce
         return result
 
+    def serialize_full(self):
+        '''Returns the header followed by the transactions, with their
+        witnesses'''
+        result = self.serialize()
+        result += encode_varint(len(self.txs))
+        for tx in self.txs:
+            result += tx.serialize_segwit()
+        return result
+
     def hash(self):
         '''Returns the hash256 interpreted little endian of the block'''
         # serialize
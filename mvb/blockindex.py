@@ -0,0 +1,215 @@
+from helper import (
+    bits_to_target,
+    hash256,
+)
+
+GENESIS_PREV = b'\x00' * 32
+MEDIAN_TIME_SPAN = 11
+# locators list this many entries back from the tip before stepping
+LOCATOR_DENSE = 10
+
+
+def block_work(target):
+    '''Returns the expected number of hashes needed to meet target'''
+    # same as 2**256 / (target + 1) without floats
+    return 2**256 // (target + 1)
+
+
+def invert_lowest_one(n):
+    return n & (n - 1)
+
+
+def get_skip_height(height):
+    '''Returns the height the skip pointer of an entry at height goes to.
+    Any number strictly lower than height works, this choice (the one
+    Bitcoin Core makes) reaches any ancestor in O(log n) steps'''
+    if height < 2:
+        return 0
+    # odd heights jump a little less far so that two consecutive entries
+    # never skip to the same place
+    if height & 1:
+        return invert_lowest_one(invert_lowest_one(height - 1)) + 1
+    return invert_lowest_one(height)
+
+
+class BlockIndexEntry:
+    '''One header in the block tree: its parent entry, height and the
+    total work of the chain that ends with it. skip points at a further
+    ancestor for get_ancestor and median_time_past is worked out once,
+    the first time it's asked for'''
+
+    __slots__ = ('hash', 'prev', 'height', 'chainwork', 'timestamp', 'bits',
+                 'skip', '_median_time_past')
+
+    def __init__(self, block_hash, prev, height, chainwork, timestamp, bits):
+        self.hash = block_hash
+        self.prev = prev
+        self.height = height
+        self.chainwork = chainwork
+        self.timestamp = timestamp
+        self.bits = bits
+        if prev is None:
+            self.skip = None
+        else:
+            self.skip = prev.get_ancestor(get_skip_height(height))
+        self._median_time_past = None
+
+    def __repr__(self):
+        return 'BlockIndexEntry({}, height={})'.format(self.hash.hex(), self.height)
+
+    @property
+    def median_time_past(self):
+        '''Median timestamp of this entry and the 10 before it'''
+        if self._median_time_past is None:
+            timestamps = []
+            entry = self
+            while entry is not None and len(timestamps) < MEDIAN_TIME_SPAN:
+                timestamps.append(entry.timestamp)
+                entry = entry.prev
+            timestamps.sort()
+            self._median_time_past = timestamps[len(timestamps) // 2]
+        return self._median_time_past
+
+    def get_ancestor(self, height):
+        '''Returns the ancestor at height, self included, or None'''
+        if height > self.height or height < 0:
+            return None
+        walk = self
+        walk_height = self.height
+        while walk_height > height:
+            skip_height = get_skip_height(walk_height)
+            skip_height_prev = get_skip_height(walk_height - 1)
+            # take the skip unless the parent's skip gets closer
+            if walk.skip is not None and (
+                    skip_height == height
+                    or (skip_height > height
+                        and not (skip_height_prev < skip_height - 2
+                                 and skip_height_prev >= height))):
+                walk = walk.skip
+                walk_height = skip_height
+            else:
+                walk = walk.prev
+                walk_height -= 1
+        return walk
+
+
+class BlockIndex:
+    '''Every header we know about, forks included, as a tree of entries
+    keyed by hash. The best tip is the entry with the most chainwork, it's
+    updated as headers are added so looking it up is O(1); on equal work
+    the one seen first stays the tip.
+    '''
+
+    def __init__(self):
+        self.entries = {}
+        self.best = None
+        # work per bits, there are only a few hundred distinct values
+        self.work = {}
+
+    def __contains__(self, block_hash):
+        return block_hash in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, block_hash):
+        return self.entries[block_hash]
+
+    def get(self, block_hash):
+        return self.entries.get(block_hash)
+
+    def insert(self, block_hash, prev_block, timestamp, bits):
+        if block_hash in self.entries:
+            return self.entries[block_hash]
+        if prev_block == GENESIS_PREV:
+            prev = None
+        else:
+            prev = self.entries.get(prev_block)
+            if prev is None:
+                raise KeyError('parent {} is not in the index'.format(prev_block.hex()))
+        work = self.work.get(bits)
+        if work is None:
+            work = self.work[bits] = block_work(bits_to_target(bits))
+        if prev is None:
+            entry = BlockIndexEntry(block_hash, None, 0, work, timestamp, bits)
+        else:
+            entry = BlockIndexEntry(
+                block_hash, prev, prev.height + 1, prev.chainwork + work, timestamp, bits)
+        self.entries[block_hash] = entry
+        if self.best is None or entry.chainwork > self.best.chainwork:
+            self.best = entry
+        return entry
+
+    def add(self, block):
+        '''Adds a header, a Block whose parent is already in the index or
+        that starts a chain, and returns its entry'''
+        return self.insert(block.hash(), block.prev_block, block.timestamp, block.bits)
+
+    def add_raw(self, header, block_hash=None):
+        '''Adds a raw 80 byte header without parsing it into a Block,
+        block_hash saves hashing it again when it's already known'''
+        if block_hash is None:
+            block_hash = hash256(header)[::-1]
+        return self.insert(
+            block_hash, bytes(header[4:36])[::-1],
+            int.from_bytes(header[68:72], 'little'), bytes(header[72:76]))
+
+    def load(self, store):
+        '''Adds every header of a HeaderStore, reusing its stored hashes'''
+        for header, block_hash in store.scan():
+            self.add_raw(header, block_hash)
+
+    def fork_point(self, a, b):
+        '''Returns the last entry that the chains ending in entries a and
+        b have in common, or None if they share nothing'''
+        if a.height > b.height:
+            a = a.get_ancestor(b.height)
+        elif b.height > a.height:
+            b = b.get_ancestor(a.height)
+        while a is not b:
+            if a is None or b is None:
+                return None
+            # entries at the same height skip to the same height, when
+            # those differ too the fork is further down
+            if a.skip is not b.skip:
+                a = a.skip
+                b = b.skip
+            else:
+                a = a.prev
+                b = b.prev
+        return a
+
+    def reorg_path(self, old_tip, new_tip):
+        '''Returns the entries to disconnect, old_tip first, and the ones
+        to connect, lowest first, to move from old_tip to new_tip'''
+        fork = self.fork_point(old_tip, new_tip)
+        disconnect = []
+        entry = old_tip
+        while entry is not fork:
+            disconnect.append(entry)
+            entry = entry.prev
+        connect = []
+        entry = new_tip
+        while entry is not fork:
+            connect.append(entry)
+            entry = entry.prev
+        connect.reverse()
+        return disconnect, connect
+
+    def locator(self, entry=None):
+        '''Returns block hashes to describe the chain ending in entry,
+        the best tip by default, to a peer: the last ten, then stepping
+        back twice as far each time, always ending with the genesis'''
+        if entry is None:
+            entry = self.best
+        hashes = []
+        step = 1
+        while entry is not None:
+            hashes.append(entry.hash)
+            if entry.height == 0:
+                break
+            height = max(entry.height - step, 0)
+            entry = entry.get_ancestor(height)
+            if len(hashes) > LOCATOR_DENSE:
+                step *= 2
+        return hashes
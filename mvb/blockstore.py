@@ -0,0 +1,413 @@
+import mmap
+import os
+import sqlite3
+import threading
+from io import BytesIO
+
+from block import Block
+from helper import (
+    hash256,
+    int_to_little_endian,
+    little_endian_to_int,
+    read_varint,
+)
+from prevout import PrevoutProvider
+from tx import LazyTx
+
+MAINNET_MAGIC = bytes.fromhex('f9beb4d9')
+TESTNET_MAGIC = bytes.fromhex('0b110907')
+# how many blocks below the tip keep their undo data when pruning
+MIN_BLOCKS_TO_KEEP = 288
+# PRAGMA user_version of index.db, 1 added the header column
+SCHEMA_VERSION = 1
+
+
+def tx_locations(raw):
+    '''Returns (tx id, offset, length) of every transaction in a raw
+    block, offsets are relative to the start of the block'''
+    s = BytesIO(raw)
+    s.seek(80)
+    locations = []
+    for _ in range(read_varint(s)):
+        start = s.tell()
+        tx = LazyTx.parse(s)
+        locations.append((tx.hash(), start, s.tell() - start))
+    return locations
+
+
+class TxIndex:
+    '''Maps tx id to the (file, offset, length) of the raw transaction
+    inside the block files, backed by sqlite. Blocks are indexed in
+    batches and each block only once.'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS txs '
+            '(txid BLOB PRIMARY KEY, file INTEGER NOT NULL, offset INTEGER NOT NULL, '
+            'length INTEGER NOT NULL) WITHOUT ROWID')
+        self.db.execute('CREATE TABLE IF NOT EXISTS indexed (hash BLOB PRIMARY KEY) WITHOUT ROWID')
+        self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM txs').fetchone()[0]
+
+    def is_indexed(self, block_hash):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT 1 FROM indexed WHERE hash = ?', (block_hash,)).fetchone()
+        return row is not None
+
+    def add_blocks(self, blocks):
+        '''Indexes [(block hash, (file, offset, length), raw)] in one
+        transaction, skipping blocks that are already indexed'''
+        rows = []
+        hashes = []
+        for block_hash, (file_number, offset, _), raw in blocks:
+            if self.is_indexed(block_hash):
+                continue
+            hashes.append((block_hash,))
+            for tx_hash, start, length in tx_locations(raw):
+                rows.append((tx_hash, file_number, offset + start, length))
+        with self.lock:
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO txs VALUES (?, ?, ?, ?)', rows)
+                self.db.executemany('INSERT OR IGNORE INTO indexed VALUES (?)', hashes)
+
+    def locate(self, tx_id):
+        '''Returns (file, offset, length) of the hex tx_id or None'''
+        with self.lock:
+            row = self.db.execute(
+                'SELECT file, offset, length FROM txs WHERE txid = ?',
+                (bytes.fromhex(tx_id),)).fetchone()
+        if row is None:
+            return None
+        return tuple(row)
+
+    def remove_file(self, file_number, block_hashes):
+        '''Forgets every transaction stored in the block file and that its
+        blocks, block_hashes, were indexed, so they are indexed again if
+        they are ever stored again'''
+        with self.lock:
+            with self.db:
+                self.db.execute('DELETE FROM txs WHERE file = ?', (file_number,))
+                self.db.executemany(
+                    'DELETE FROM indexed WHERE hash = ?', [(h,) for h in block_hashes])
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class BlockStore:
+    '''blk-file style storage. Each block is appended as the network magic,
+    a 4 byte little-endian length and the raw block to blk00000.dat,
+    blk00001.dat, ... starting a new file once max_file_size is reached.
+    An sqlite index maps block hash to (file, offset, length) and reads
+    are zero-copy memoryview slices of the memory-mapped files.
+
+    Appends are buffered, flush() writes them out and only then adds them
+    to the index, so the index never points at bytes that aren't on disk.
+
+    With txindex=True a TxIndex in the same directory is kept up to date
+    on every flush, build_txindex() catches up on blocks stored before.
+
+    With a prune_depth, at least MIN_BLOCKS_TO_KEEP, prune() deletes whole
+    files whose blocks are all more than prune_depth below the tip. Headers
+    stay in the index and lookups of pruned blocks or transactions return
+    None.
+    '''
+
+    def __init__(self, directory, testnet=False, max_file_size=128 * 1024 * 1024,
+                 txindex=False, prune_depth=None):
+        self.directory = directory
+        self.magic = TESTNET_MAGIC if testnet else MAINNET_MAGIC
+        self.max_file_size = max_file_size
+        if prune_depth is not None and prune_depth < MIN_BLOCKS_TO_KEEP:
+            raise ValueError('prune_depth has to be at least {}'.format(MIN_BLOCKS_TO_KEEP))
+        self.prune_depth = prune_depth
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS blocks '
+            '(hash BLOB PRIMARY KEY, file INTEGER NOT NULL, offset INTEGER NOT NULL, '
+            'length INTEGER NOT NULL, height INTEGER, header BLOB NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS pruned (file INTEGER PRIMARY KEY)')
+        self.db.commit()
+        self.migrate()
+        self.pruned = set(row[0] for row in self.db.execute('SELECT file FROM pruned'))
+        # {block hash: (file, offset, length, height, header)} not flushed yet
+        self.pending = {}
+        self.maps = {}
+        numbers = [
+            int(name[3:8]) for name in os.listdir(directory)
+            if name.startswith('blk') and name.endswith('.dat')
+        ]
+        self.file_number = max(numbers) if numbers else 0
+        self.file = open(self.path(self.file_number), 'ab', buffering=1024 * 1024)
+        self.txindex = None
+        if txindex:
+            self.txindex = TxIndex(os.path.join(directory, 'txindex.db'))
+        # [(block hash, location, raw)] waiting for the next flush
+        self.pending_txindex = []
+
+    def migrate(self):
+        '''Brings an index.db written by an older version up to
+        SCHEMA_VERSION'''
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(blocks)')]
+        if 'header' not in columns:
+            # ADD COLUMN can't be NOT NULL without a default, the headers
+            # are filled in from the block files right after
+            rows = self.db.execute('SELECT hash, file, offset FROM blocks').fetchall()
+            headers = []
+            for block_hash, file_number, offset in rows:
+                with open(self.path(file_number), 'rb') as f:
+                    f.seek(offset)
+                    headers.append((f.read(80), block_hash))
+            with self.db:
+                self.db.execute('ALTER TABLE blocks ADD COLUMN header BLOB')
+                self.db.executemany('UPDATE blocks SET header = ? WHERE hash = ?', headers)
+        self.db.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+        self.db.commit()
+
+    def path(self, file_number):
+        return os.path.join(self.directory, 'blk{:05d}.dat'.format(file_number))
+
+    def write_block(self, raw, height=None):
+        '''Appends the raw block and returns its (file, offset, length)'''
+        block_hash = hash256(raw[:80])[::-1]
+        with self.lock:
+            location = self.locate(block_hash)
+            if location is not None:
+                return location
+            size = self.file.tell()
+            if size > 0 and size + 8 + len(raw) > self.max_file_size:
+                # start the next file
+                self.flush()
+                self.file.close()
+                self.file_number += 1
+                self.file = open(self.path(self.file_number), 'ab', buffering=1024 * 1024)
+                size = 0
+            self.file.write(self.magic + int_to_little_endian(len(raw), 4))
+            self.file.write(raw)
+            location = (self.file_number, size + 8, len(raw))
+            self.pending[block_hash] = location + (height, bytes(raw[:80]))
+            if self.txindex is not None:
+                self.pending_txindex.append((block_hash, location, raw))
+            return location
+
+    def flush(self):
+        '''Writes out buffered blocks, then indexes them'''
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            if self.pending:
+                rows = [(h,) + location for h, location in self.pending.items()]
+                with self.db:
+                    self.db.executemany(
+                        'INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?)', rows)
+                self.pending = {}
+            if self.pending_txindex:
+                self.txindex.add_blocks(self.pending_txindex)
+                self.pending_txindex = []
+
+    def build_txindex(self, batch_size=1000):
+        '''Adds every stored block that's not in the TxIndex yet, batch_size
+        blocks per transaction'''
+        if self.txindex is None:
+            self.txindex = TxIndex(os.path.join(self.directory, 'txindex.db'))
+        self.flush()
+        with self.lock:
+            rows = self.db.execute('SELECT hash, file, offset, length FROM blocks').fetchall()
+        batch = []
+        for block_hash, file_number, offset, length in rows:
+            if file_number in self.pruned or self.txindex.is_indexed(block_hash):
+                continue
+            location = (file_number, offset, length)
+            batch.append((block_hash, location, self.read(*location)))
+            if len(batch) >= batch_size:
+                self.txindex.add_blocks(batch)
+                batch = []
+        if batch:
+            self.txindex.add_blocks(batch)
+
+    def locate(self, block_hash):
+        '''Returns (file, offset, length) of the block or None, including
+        when it has been pruned'''
+        with self.lock:
+            if block_hash in self.pending:
+                return self.pending[block_hash][:3]
+            row = self.db.execute(
+                'SELECT file, offset, length FROM blocks WHERE hash = ?',
+                (block_hash,)).fetchone()
+        if row is None or row[0] in self.pruned:
+            return None
+        return tuple(row)
+
+    def get_header(self, block_hash):
+        '''Returns the header as a Block, even for pruned blocks, or None'''
+        with self.lock:
+            if block_hash in self.pending:
+                header = self.pending[block_hash][4]
+            else:
+                row = self.db.execute(
+                    'SELECT header FROM blocks WHERE hash = ?', (block_hash,)).fetchone()
+                if row is None:
+                    return None
+                header = row[0]
+        return Block.parse(BytesIO(header))
+
+    def is_pruned(self, block_hash):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT file FROM blocks WHERE hash = ?', (block_hash,)).fetchone()
+        return row is not None and row[0] in self.pruned
+
+    def prune(self, tip_height, undo_store=None, reorg_window=MIN_BLOCKS_TO_KEEP):
+        '''Deletes every block file whose blocks are all more than
+        prune_depth below tip_height, along with their txindex entries, and
+        the undo data more than reorg_window below the tip. Blocks inside
+        the reorg window are kept whatever prune_depth says, rolling one
+        back needs its transactions as well as its undo data. Returns the
+        numbers of the deleted files'''
+        if self.prune_depth is None:
+            raise RuntimeError('pruning is not enabled')
+        self.flush()
+        cutoff = tip_height - max(self.prune_depth, reorg_window)
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT file, MAX(height), COUNT(height) = COUNT(*) FROM blocks GROUP BY file').fetchall()
+            deleted = []
+            for file_number, max_height, all_heights in rows:
+                # never the file being written, nor files with unknown heights
+                if file_number == self.file_number or file_number in self.pruned:
+                    continue
+                if not all_heights or max_height >= cutoff:
+                    continue
+                mapped = self.maps.pop(file_number, None)
+                if mapped is not None:
+                    try:
+                        mapped.close()
+                    except BufferError:
+                        pass
+                with self.db:
+                    self.db.execute('INSERT INTO pruned VALUES (?)', (file_number,))
+                self.pruned.add(file_number)
+                if self.txindex is not None:
+                    block_hashes = [row[0] for row in self.db.execute(
+                        'SELECT hash FROM blocks WHERE file = ?', (file_number,))]
+                    self.txindex.remove_file(file_number, block_hashes)
+                os.remove(self.path(file_number))
+                deleted.append(file_number)
+        if undo_store is not None:
+            undo_store.prune(tip_height - reorg_window)
+        return deleted
+
+    def get_map(self, file_number, end):
+        '''Returns an mmap of the file that covers at least end bytes'''
+        with self.lock:
+            if file_number == self.file_number and self.pending:
+                self.flush()
+            current = self.maps.get(file_number)
+            if current is None or len(current) < end:
+                with open(self.path(file_number), 'rb') as f:
+                    current = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # the old map, if any, goes away with its last memoryview
+                self.maps[file_number] = current
+            return current
+
+    def read_raw(self, file_number, offset, length):
+        '''Returns a memoryview of the bytes at (file, offset, length)
+        without copying them'''
+        mapped = self.get_map(file_number, offset + length)
+        return memoryview(mapped)[offset:offset + length]
+
+    def read(self, file_number, offset, length):
+        '''Returns a memoryview of the raw block at (file, offset, length)
+        without copying it'''
+        mapped = self.get_map(file_number, offset + length)
+        if mapped[offset - 8:offset - 4] != self.magic:
+            raise ValueError('no block at {}:{}'.format(file_number, offset))
+        return memoryview(mapped)[offset:offset + length]
+
+    def read_block(self, block_hash):
+        '''Returns a memoryview of the raw block or None'''
+        location = self.locate(block_hash)
+        if location is None:
+            return None
+        return self.read(*location)
+
+    def get_block(self, block_hash, testnet=False, lazy=False):
+        '''Returns the parsed Block with its transactions or None'''
+        raw = self.read_block(block_hash)
+        if raw is None:
+            return None
+        return Block.parse_full(BytesIO(raw), testnet=testnet, lazy=lazy)
+
+    def read_tx(self, tx_id):
+        '''Returns a memoryview of the raw transaction with the hex tx_id
+        or None, needs the txindex'''
+        if self.txindex is None:
+            return None
+        location = self.txindex.locate(tx_id)
+        if location is None or location[0] in self.pruned:
+            return None
+        return self.read_raw(*location)
+
+    def scan(self, file_number):
+        '''Yields the (offset, length) of every block in the file'''
+        with self.lock:
+            if file_number == self.file_number:
+                self.flush()
+        if os.path.getsize(self.path(file_number)) == 0:
+            return
+        mapped = self.get_map(file_number, 0)
+        offset = 0
+        while offset + 8 <= len(mapped):
+            if mapped[offset:offset + 4] != self.magic:
+                break
+            length = little_endian_to_int(mapped[offset + 4:offset + 8])
+            yield (offset + 8, length)
+            offset += 8 + length
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.file.close()
+            self.db.close()
+            if self.txindex is not None:
+                self.txindex.close()
+            for mapped in self.maps.values():
+                try:
+                    mapped.close()
+                except BufferError:
+                    # a memoryview is still out there, let it go with it
+                    pass
+            self.maps = {}
+
+
+class BlockFilePrevouts(PrevoutProvider):
+    '''PrevoutProvider backend reading previous transactions straight out
+    of the block files through the txindex'''
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, prev_tx, prev_index, testnet=False):
+        raw = self.store.read_tx(prev_tx.hex())
+        if raw is None:
+            raise KeyError((prev_tx, prev_index))
+        tx = LazyTx.parse(BytesIO(raw), testnet=testnet)
+        try:
+            return tx.tx_outs[prev_index]
+        except IndexError:
+            raise KeyError((prev_tx, prev_index))
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+
+# upper bounds in seconds of the load latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float('inf'))
+
+
+class Flight:
+    '''A load in progress that other callers can wait on'''
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    '''Thread-safe mapping holding at most maxsize items, evicting the least
+    recently used one. Concurrent get_or_load() calls for the same missing
+    key share a single load.'''
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.latency = [0] * len(LATENCY_BUCKETS)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.data
+
+    def __len__(self):
+        with self.lock:
+            return len(self.data)
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = self.data[key]
+            self.data.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self._set(key, value)
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.data[key]
+
+    def _set(self, key, value):
+        # caller holds the lock
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.data:
+                self.hits += 1
+                self.data.move_to_end(key)
+                return self.data[key]
+            self.misses += 1
+            return default
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.data.pop(key, default)
+
+    def items(self):
+        '''Returns a snapshot of the (key, value) pairs'''
+        with self.lock:
+            return list(self.data.items())
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def get_or_load(self, key, loader):
+        '''Returns the cached value for key, otherwise calls loader() once no
+        matter how many threads are asking and caches what it returns'''
+        with self.lock:
+            if key in self.data:
+                self.hits += 1
+                self.data.move_to_end(key)
+                return self.data[key]
+            self.misses += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        start = time.perf_counter()
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            # KeyboardInterrupt and the like too, the waiting callers
+            # mustn't take the unset value for a result
+            flight.error = e
+            raise
+        else:
+            with self.lock:
+                self._set(key, flight.value)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                del self.flights[key]
+                self.record_latency(elapsed)
+            flight.done.set()
+        return flight.value
+
+    def record_latency(self, elapsed):
+        # caller holds the lock
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.latency[i] += 1
+                return
+
+    def stats(self):
+        '''Returns the hit/miss/eviction counters and the load latency
+        histogram as {bucket upper bound: count}'''
+        with self.lock:
+            return {
+                'size': len(self.data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'latency': dict(zip(LATENCY_BUCKETS, self.latency)),
+            }
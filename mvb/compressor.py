@@ -0,0 +1,107 @@
+from s256 import S256Point
+
+'''
+Compact encodings for stored outputs. Amounts are squeezed by pulling out
+trailing decimal zeros, and the common ScriptPubKey templates are stored
+as just the hash or public key they carry.
+'''
+
+# number of special script templates, other scripts store len + this
+NUM_SPECIAL_SCRIPTS = 6
+
+
+def encode_compact_int(n):
+    '''Encodes a non-negative integer in base-128, most significant group
+    first, with the high bit marking that more bytes follow'''
+    result = bytearray([n & 0x7f])
+    n >>= 7
+    while n:
+        n -= 1
+        result.append(0x80 | (n & 0x7f))
+        n >>= 7
+    return bytes(reversed(result))
+
+
+def read_compact_int(s):
+    '''Reads an integer written by encode_compact_int from a stream'''
+    n = 0
+    while True:
+        byte = s.read(1)[0]
+        n = (n << 7) | (byte & 0x7f)
+        if byte & 0x80:
+            n += 1
+        else:
+            return n
+
+
+def compress_amount(n):
+    '''Maps an amount in satoshi to a smaller integer, round amounts
+    become very small'''
+    if n == 0:
+        return 0
+    # count the trailing decimal zeros, at most 9
+    e = 0
+    while n % 10 == 0 and e < 9:
+        n //= 10
+        e += 1
+    if e < 9:
+        # the last non-zero digit is 1-9
+        d = n % 10
+        n //= 10
+        return 1 + (n * 9 + d - 1) * 10 + e
+    return 1 + (n - 1) * 10 + 9
+
+
+def decompress_amount(x):
+    '''Inverse of compress_amount'''
+    if x == 0:
+        return 0
+    x -= 1
+    e = x % 10
+    x //= 10
+    if e < 9:
+        d = x % 9 + 1
+        x //= 9
+        n = x * 10 + d
+    else:
+        n = x + 1
+    return n * 10**e
+
+
+def compress_script(raw):
+    '''Returns the compact form of a raw ScriptPubKey'''
+    # p2pkh: OP_DUP OP_HASH160 <20 byte hash> OP_EQUALVERIFY OP_CHECKSIG
+    if len(raw) == 25 and raw[:3] == b'\x76\xa9\x14' and raw[23:] == b'\x88\xac':
+        return b'\x00' + raw[3:23]
+    # p2sh: OP_HASH160 <20 byte hash> OP_EQUAL
+    if len(raw) == 23 and raw[:2] == b'\xa9\x14' and raw[22] == 0x87:
+        return b'\x01' + raw[2:22]
+    # p2pk with a compressed public key: <33 byte sec> OP_CHECKSIG
+    if len(raw) == 35 and raw[0] == 33 and raw[1] in (2, 3) and raw[34] == 0xac:
+        return raw[1:34]
+    # p2pk with an uncompressed public key only needs x and the parity of y
+    if len(raw) == 67 and raw[0] == 65 and raw[1] == 4 and raw[66] == 0xac:
+        try:
+            S256Point.parse(raw[1:66])
+        except ValueError:
+            # not on the curve, has to be stored as is
+            pass
+        else:
+            return bytes([4 | (raw[65] & 1)]) + raw[2:34]
+    return encode_compact_int(len(raw) + NUM_SPECIAL_SCRIPTS) + raw
+
+
+def read_compressed_script(s):
+    '''Reads a script written by compress_script from a stream and returns
+    the raw ScriptPubKey'''
+    size = read_compact_int(s)
+    if size == 0:
+        return b'\x76\xa9\x14' + s.read(20) + b'\x88\xac'
+    if size == 1:
+        return b'\xa9\x14' + s.read(20) + b'\x87'
+    if size in (2, 3):
+        return b'\x21' + bytes([size]) + s.read(32) + b'\xac'
+    if size in (4, 5):
+        point = S256Point.parse(bytes([size - 2]) + s.read(32))
+        return b'\x41' + point.sec(compressed=False) + b'\xac'
+    return s.read(size - NUM_SPECIAL_SCRIPTS)
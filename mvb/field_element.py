@@ -12,6 +12,7 @@ F(p) = {0, 1, 2, 3, ..., p - 1} where p is prime.
 '''
 
 class FieldElement:
+  __slots__ = ('num', 'prime')
 
   def __init__(self, num, prime):
     if num >= prime or num < 0:
@@ -0,0 +1,104 @@
+'''Chains of headers, blocks and transactions for the tests and the
+benchmarks to share'''
+from block import LOWEST_BITS, Block
+from helper import (
+    bits_to_target,
+    calculate_new_bits,
+    hash256,
+    merkle_root,
+)
+from script import Script, p2pkh_script
+from tx import Tx, TxIn, TxOut
+
+REGTEST_BITS = bytes.fromhex('ffff7f20')
+REGTEST_MAX_TARGET = bits_to_target(REGTEST_BITS)
+GENESIS_TIME = 1231006505
+START_TIME = 1296688602
+
+
+def link_headers(blocks, prev_block=b'\x00' * 32):
+    '''Points every Block at the one before it and the first one at
+    prev_block, returns blocks'''
+    for block in blocks:
+        block.prev_block = prev_block
+        prev_block = block.hash()
+    return blocks
+
+
+def make_headers(count, prev_block=b'\x00' * 32, bits=LOWEST_BITS, start_time=GENESIS_TIME, tag=0):
+    '''Returns count linked Blocks 600 seconds apart with no proof of
+    work, tag tells branches off the same block apart'''
+    return link_headers([
+        Block(1, None, (tag << 32 | i).to_bytes(32, 'big'), start_time + 600 * i,
+              bits, i.to_bytes(4, 'little'))
+        for i in range(count)
+    ], prev_block)
+
+
+def mine_header(prev_block, timestamp, bits=REGTEST_BITS, version=4):
+    '''Returns a raw header that meets the target of bits'''
+    target = bits_to_target(bits)
+    start = version.to_bytes(4, 'little') + prev_block + b'\x11' * 32 \
+        + timestamp.to_bytes(4, 'little') + bits
+    nonce = 0
+    while True:
+        raw = start + nonce.to_bytes(4, 'little')
+        if int.from_bytes(hash256(raw), 'little') < target:
+            return raw
+        nonce += 1
+
+
+def make_chain(count, spacing=600):
+    '''Returns count raw headers with proof of work from genesis,
+    retargeting every 2016'''
+    headers = []
+    prev_block = b'\x00' * 32
+    bits = REGTEST_BITS
+    for height in range(count):
+        if height and height % 2016 == 0:
+            first = int.from_bytes(headers[height - 2016][68:72], 'little')
+            last = int.from_bytes(headers[-1][68:72], 'little')
+            bits = calculate_new_bits(bits, last - first, REGTEST_MAX_TARGET)
+        raw = mine_header(prev_block, START_TIME + spacing * height, bits)
+        headers.append(raw)
+        prev_block = hash256(raw)
+    return headers
+
+
+def make_txs(count):
+    '''Returns count unrelated (unsigned) transactions'''
+    return [Tx(1, [TxIn(hash256(i.to_bytes(4, 'little')), 0)],
+               [TxOut(1000 + i, p2pkh_script(b'\x00' * 20))], 0)
+            for i in range(count)]
+
+
+def make_block_txs():
+    '''coinbase paying 2 outputs, a tx spending the first one and a tx
+    spending the output of that tx in the same block'''
+    coinbase = Tx(1, [TxIn(bytes(32), 0xffffffff, Script([b'\x01']))],
+                  [TxOut(5000, p2pkh_script(b'\x01' * 20)),
+                   TxOut(0, Script([0x6a, b'data']))], 0)
+    spend = Tx(1, [TxIn(coinbase.hash(), 0)], [TxOut(4000, p2pkh_script(b'\x02' * 20))], 0)
+    chained = Tx(1, [TxIn(spend.hash(), 0)], [TxOut(3000, p2pkh_script(b'\x03' * 20))], 0)
+    return [coinbase, spend, chained]
+
+
+def make_block(txs, prev_block=b'\x00' * 32, timestamp=1500000000, bits=REGTEST_BITS, nonce=b'\x00' * 4):
+    '''Builds a Block over txs with the right merkle root'''
+    root = merkle_root([tx.hash()[::-1] for tx in txs])[::-1]
+    return Block(0x20000000, prev_block, root, timestamp, bits, nonce,
+                 tx_hashes=[tx.hash() for tx in txs], txs=txs)
+
+
+def make_blocks(length):
+    '''Returns the raw bytes of length linked blocks, each with one
+    coinbase'''
+    prev_block = b'\x00' * 32
+    raws = []
+    for height in range(length):
+        coinbase = Tx(1, [TxIn(bytes(32), 0xffffffff, Script([height.to_bytes(3, 'little')]))],
+                      [TxOut(5000000000, p2pkh_script(bytes(20)))], 0)
+        block = make_block([coinbase], prev_block=prev_block)
+        raws.append(block.serialize_full())
+        prev_block = block.hash()
+    return raws
@@ -0,0 +1,153 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from headerstore import HEADER_SIZE
+from helper import (
+    MAX_TARGET,
+    bits_to_target,
+    calculate_new_bits,
+    hash256,
+)
+
+RETARGET_INTERVAL = 2016
+MEDIAN_TIME_SPAN = 11
+MAX_FUTURE_BLOCK_TIME = 2 * 60 * 60
+# headers handed to a worker process at a time
+HASH_CHUNK = 20000
+
+
+def hash_headers(data):
+    '''Returns the concatenated hash256 of every 80 byte header in data.
+    Runs in the worker processes'''
+    return b''.join(
+        hash256(data[i:i + HEADER_SIZE])
+        for i in range(0, len(data), HEADER_SIZE))
+
+
+def median_time(timestamps):
+    '''Returns the median of up to the last 11 timestamps'''
+    last = sorted(timestamps[-MEDIAN_TIME_SPAN:])
+    return last[len(last) // 2]
+
+
+class HeaderChainValidator:
+    '''Checks runs of raw 80 byte headers against the chain they extend:
+    prev-hash linkage, proof of work, the 2016-block difficulty retarget
+    and timestamps (above the median of the last 11, not more than two
+    hours ahead of now).
+
+    Hashing is the expensive part and doesn't depend on order, so it's
+    done first, in chunks on a pool of worker processes. The checks that
+    follow only compare integers and bytes in one pass over the run.
+
+    The chain below a run comes from a HeaderStore, which only has to hold
+    the headers up to the run's start. The testnet minimum difficulty rule
+    isn't implemented, retarget=False turns retargets off the way regtest
+    does and max_target is the network's proof of work limit.
+    '''
+
+    def __init__(self, store=None, workers=1, max_target=MAX_TARGET, retarget=True):
+        self.store = store
+        self.workers = workers
+        self.max_target = max_target
+        self.retarget = retarget
+        self.executor = None
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def hash_all(self, data):
+        '''Returns the hash256 of every header in data, a bytes-like
+        object of back to back 80 byte headers'''
+        data = bytes(data)
+        chunk = HASH_CHUNK * HEADER_SIZE
+        chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+        if self.executor is None or len(chunks) < 2:
+            hashes = b''.join(hash_headers(c) for c in chunks)
+        else:
+            hashes = b''.join(self.executor.map(hash_headers, chunks))
+        return [hashes[i:i + 32] for i in range(0, len(hashes), 32)]
+
+    def stored(self, height):
+        if self.store is None or height >= len(self.store):
+            raise ValueError('no header at height {} to build on'.format(height))
+        return bytes(self.store.raw(height))
+
+    def check(self, headers, height=0, now=None):
+        '''Checks headers, raw headers that go at height and up, and
+        returns their hashes in the order used by the store (reversed).
+        Raises ValueError naming the first bad header'''
+        data = b''.join(bytes(h) for h in headers)
+        if len(data) != len(headers) * HEADER_SIZE:
+            raise ValueError('headers have to be 80 bytes each')
+        if now is None:
+            now = time.time()
+        max_time = now + MAX_FUTURE_BLOCK_TIME
+        hashes = self.hash_all(data)
+        # what the run builds on
+        if height == 0:
+            prev_hash = b'\x00' * 32
+            prev_bits = None
+            timestamps = []
+        else:
+            prev = self.stored(height - 1)
+            prev_hash = hash256(prev)
+            prev_bits = prev[72:76]
+            timestamps = [
+                int.from_bytes(self.stored(h)[68:72], 'little')
+                for h in range(max(0, height - MEDIAN_TIME_SPAN), height)
+            ]
+        # timestamp of the first header of each retarget period in the run
+        period_start = {}
+        targets = {}
+        result = []
+        for i, h256 in enumerate(hashes):
+            current = height + i
+            raw = data[i * HEADER_SIZE:(i + 1) * HEADER_SIZE]
+            if raw[4:36] != prev_hash:
+                raise ValueError('header {} does not build on the one before'.format(current))
+            bits = raw[72:76]
+            if current % RETARGET_INTERVAL == 0 and current > 0 and self.retarget:
+                first = current - RETARGET_INTERVAL
+                if first in period_start:
+                    first_time = period_start[first]
+                else:
+                    first_time = int.from_bytes(self.stored(first)[68:72], 'little')
+                expected = calculate_new_bits(prev_bits, timestamps[-1] - first_time, self.max_target)
+                if bits != expected:
+                    raise ValueError('header {} has bits {} instead of {}'.format(
+                        current, bits.hex(), expected.hex()))
+            elif prev_bits is not None and bits != prev_bits:
+                raise ValueError('header {} changes the bits outside a retarget'.format(current))
+            if bits not in targets:
+                target = bits_to_target(bits)
+                if target > self.max_target:
+                    raise ValueError('header {} is below the minimum difficulty'.format(current))
+                targets[bits] = target
+            if int.from_bytes(h256, 'little') >= targets[bits]:
+                raise ValueError('header {} does not meet its target'.format(current))
+            timestamp = int.from_bytes(raw[68:72], 'little')
+            if timestamps and timestamp <= median_time(timestamps):
+                raise ValueError('header {} is not after the median time past'.format(current))
+            if timestamp > max_time:
+                raise ValueError('header {} is too far in the future'.format(current))
+            if current % RETARGET_INTERVAL == 0:
+                period_start[current] = timestamp
+            timestamps.append(timestamp)
+            if len(timestamps) > MEDIAN_TIME_SPAN:
+                del timestamps[0]
+            prev_hash = h256
+            prev_bits = bits
+            result.append(h256[::-1])
+        return result
+
+    def check_and_append(self, headers, now=None):
+        '''Checks headers on top of the store and appends them, all or
+        none of them'''
+        hashes = self.check(headers, len(self.store), now)
+        self.store.append_many(headers)
+        return hashes
@@ -0,0 +1,147 @@
+import numpy as np
+
+from headerchain import RETARGET_INTERVAL
+from headerstore import HASH_SIZE, HEADER_SIZE
+
+# the 80 byte header as a record, little-endian like the serialization
+HEADER_DTYPE = np.dtype([
+    ('version', '<u4'),
+    ('prev_block', 'u1', 32),
+    ('merkle_root', 'u1', 32),
+    ('timestamp', '<u4'),
+    ('bits', '<u4'),
+    ('nonce', '<u4'),
+])
+# bits of the lowest difficulty, 0xffff001d
+LOWEST_COEFFICIENT = 0xffff
+LOWEST_EXPONENT = 0x1d
+
+
+class HeaderColumns:
+    '''A range of headers as NumPy columns, read straight out of the raw
+    80 byte records with frombuffer, so nothing is copied or parsed per
+    header. Counterpart of the per-Block methods (bip9, difficulty, ...)
+    for whole ranges at a time.
+
+    start is the height of the first header, windows line up with the
+    2016-block retarget periods.
+    '''
+
+    def __init__(self, headers, hashes=None, start=0):
+        self.records = np.frombuffer(headers, dtype=HEADER_DTYPE)
+        if hashes is None:
+            self.hashes = None
+        else:
+            # one row of 32 bytes per header, in display order
+            self.hashes = np.frombuffer(hashes, dtype=np.uint8).reshape(-1, HASH_SIZE)
+        self.start = start
+
+    @classmethod
+    def from_store(cls, store, start=0, stop=None):
+        '''Columns over the headers of a HeaderStore from start to stop'''
+        headers, hashes = store.views(start, stop)
+        return cls(headers, hashes, start)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def version(self):
+        return self.records['version']
+
+    @property
+    def timestamp(self):
+        return self.records['timestamp']
+
+    @property
+    def bits(self):
+        return self.records['bits']
+
+    @property
+    def nonce(self):
+        return self.records['nonce']
+
+    def heights(self):
+        return np.arange(self.start, self.start + len(self), dtype=np.int64)
+
+    def bip9(self):
+        '''Boolean array, whether each header signals BIP9'''
+        return self.version >> 29 == 0b001
+
+    def bip91(self):
+        '''Boolean array, whether each header signals BIP91'''
+        return self.version >> 4 & 1 == 1
+
+    def bip141(self):
+        '''Boolean array, whether each header signals BIP141'''
+        return self.version >> 1 & 1 == 1
+
+    def signalling(self, bit):
+        '''Boolean array, whether each header is a BIP9 version with bit set'''
+        return self.bip9() & (self.version >> bit & 1 == 1)
+
+    def window_counts(self, mask, window=RETARGET_INTERVAL):
+        '''Returns the starting heights of the windows the range touches
+        and how many headers of each have mask set'''
+        index = self.heights() // window
+        first = index[0] if len(index) else 0
+        counts = np.bincount(index - first, weights=mask).astype(np.int64)
+        starts = (np.arange(len(counts), dtype=np.int64) + first) * window
+        return starts, counts
+
+    def difficulty(self):
+        '''Float array of the difficulty of each header'''
+        bits = self.bits
+        coefficient = (bits & 0xffffff).astype(np.float64)
+        exponent = (bits >> 24).astype(np.float64)
+        # lowest target / target with the 256**(exponent - 3) factors
+        # of both folded into one power
+        return LOWEST_COEFFICIENT / coefficient * 256.0 ** (LOWEST_EXPONENT - exponent)
+
+    def retargets(self):
+        '''Returns the heights where the bits change and the difficulty
+        from there on'''
+        bits = self.bits
+        if len(bits) == 0:
+            return np.array([], dtype=np.int64), np.array([])
+        changes = np.concatenate(([0], np.flatnonzero(bits[1:] != bits[:-1]) + 1))
+        return self.heights()[changes], self.difficulty()[changes]
+
+    def intervals(self):
+        '''Seconds between each header and the one before it, can be
+        negative as timestamps only have to beat the median time past'''
+        return np.diff(self.timestamp.astype(np.int64))
+
+    def interval_stats(self, window=RETARGET_INTERVAL):
+        '''Returns overall block interval statistics and the mean
+        interval per window'''
+        intervals = self.intervals()
+        if len(intervals) == 0:
+            return {'count': 0, 'windows': (np.array([], dtype=np.int64), np.array([]))}
+        index = self.heights()[1:] // window
+        first = index[0]
+        sums = np.bincount(index - first, weights=intervals)
+        sizes = np.bincount(index - first)
+        starts = (np.arange(len(sums), dtype=np.int64) + first) * window
+        return {
+            'count': len(intervals),
+            'mean': float(intervals.mean()),
+            'median': float(np.median(intervals)),
+            'std': float(intervals.std()),
+            'min': int(intervals.min()),
+            'max': int(intervals.max()),
+            'p90': float(np.percentile(intervals, 90)),
+            'windows': (starts, sums / np.maximum(sizes, 1)),
+        }
+
+    def hash_bytes(self, i):
+        '''Returns the hash of the i-th header of the range'''
+        return self.hashes[i].tobytes()
+
+
+def raw_columns(headers, start=0):
+    '''HeaderColumns over a list of raw 80 byte headers'''
+    data = b''.join(bytes(h) for h in headers)
+    if len(data) != len(headers) * HEADER_SIZE:
+        raise ValueError('headers have to be 80 bytes each')
+    return HeaderColumns(data, start=start)
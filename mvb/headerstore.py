@@ -0,0 +1,244 @@
+import mmap
+import os
+import sys
+import threading
+from io import BytesIO
+
+from block import Block
+from helper import hash256
+
+HEADER_SIZE = 80
+HASH_SIZE = 32
+
+
+class HeaderStore:
+    '''A chain of block headers in a fixed-record file, the header at
+    height h is at byte h * 80. The hash of every header is kept in a
+    parallel file of 32 byte records, so opening the store needs neither
+    parsing nor hashing: both files are memory-mapped and the hash ->
+    height index is built from the hash records the first time it's
+    needed. Headers are parsed into Block objects only when asked for.
+
+    The index is keyed by the last 8 bytes of the hash as an integer,
+    which is cheap to build, every hit is checked against the full hash
+    and the rare prefixes shared by several headers are kept aside.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self.headers_path = os.path.join(directory, 'headers.dat')
+        self.hashes_path = os.path.join(directory, 'hashes.dat')
+        for path in (self.headers_path, self.hashes_path):
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+        self.count = self.recover()
+        self.headers_file = open(self.headers_path, 'ab')
+        self.hashes_file = open(self.hashes_path, 'ab')
+        self.headers_map = None
+        self.hashes_map = None
+        self.mapped_count = 0
+        self.index = None
+        # {full hash: height} for headers whose index key isn't unique
+        self.collisions = {}
+
+    def recover(self):
+        '''Drops partial records and rehashes headers whose hash didn't make
+        it to disk. Returns the number of headers'''
+        count = os.path.getsize(self.headers_path) // HEADER_SIZE
+        hashed = os.path.getsize(self.hashes_path) // HASH_SIZE
+        with open(self.headers_path, 'r+b') as f:
+            f.truncate(count * HEADER_SIZE)
+            if hashed < count:
+                f.seek(hashed * HEADER_SIZE)
+                missing = f.read((count - hashed) * HEADER_SIZE)
+            else:
+                missing = b''
+        with open(self.hashes_path, 'r+b') as f:
+            f.truncate(min(hashed, count) * HASH_SIZE)
+            f.seek(0, os.SEEK_END)
+            for i in range(0, len(missing), HEADER_SIZE):
+                f.write(hash256(missing[i:i + HEADER_SIZE])[::-1])
+        return count
+
+    def __len__(self):
+        return self.count
+
+    def remap(self):
+        # caller holds the lock
+        self.headers_file.flush()
+        self.hashes_file.flush()
+        for mapped in (self.headers_map, self.hashes_map):
+            if mapped is not None:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # a memoryview is still out there, let it go with it
+                    pass
+        if self.count == 0:
+            self.headers_map = self.hashes_map = None
+        else:
+            with open(self.headers_path, 'rb') as f:
+                self.headers_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(self.hashes_path, 'rb') as f:
+                self.hashes_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mapped_count = self.count
+
+    def check_height(self, height):
+        # caller holds the lock
+        if height < 0 or height >= self.count:
+            raise IndexError('no header at height {}'.format(height))
+        if height >= self.mapped_count:
+            self.remap()
+
+    def raw(self, height):
+        '''Returns the 80 byte header at height as a memoryview'''
+        with self.lock:
+            self.check_height(height)
+            start = height * HEADER_SIZE
+            return memoryview(self.headers_map)[start:start + HEADER_SIZE]
+
+    def hash_at(self, height):
+        '''Returns the hash of the header at height'''
+        with self.lock:
+            self.check_height(height)
+            start = height * HASH_SIZE
+            return self.hashes_map[start:start + HASH_SIZE]
+
+    def get(self, height):
+        '''Returns the header at height as a Block'''
+        return Block.parse(BytesIO(self.raw(height)))
+
+    def tip(self):
+        '''Returns the hash of the last header or None'''
+        if self.count == 0:
+            return None
+        return self.hash_at(self.count - 1)
+
+    def views(self, start=0, stop=None):
+        '''Returns memoryviews over the raw headers and the hashes from
+        start up to stop (the tip by default)'''
+        with self.lock:
+            if stop is None or stop > self.count:
+                stop = self.count
+            if start >= stop:
+                return memoryview(b''), memoryview(b'')
+            self.check_height(stop - 1)
+            # views keep the maps open if the store remaps meanwhile
+            return (memoryview(self.headers_map)[start * HEADER_SIZE:stop * HEADER_SIZE],
+                    memoryview(self.hashes_map)[start * HASH_SIZE:stop * HASH_SIZE])
+
+    def scan(self, start=0):
+        '''Yields (raw header, hash) for every header from start up as
+        bytes, reading straight from the maps'''
+        headers, hashes = self.views(start)
+        for i in range(len(headers) // HEADER_SIZE):
+            yield (bytes(headers[i * HEADER_SIZE:(i + 1) * HEADER_SIZE]),
+                   bytes(hashes[i * HASH_SIZE:(i + 1) * HASH_SIZE]))
+
+    @staticmethod
+    def index_key(block_hash):
+        return int.from_bytes(block_hash[HASH_SIZE - 8:], sys.byteorder)
+
+    def build_index(self):
+        # caller holds the lock
+        if self.count > self.mapped_count:
+            self.remap()
+        self.index = {}
+        self.collisions = {}
+        if self.count == 0:
+            return
+        # every 4th native 8 byte word is the tail of a hash
+        words = memoryview(self.hashes_map)[:self.count * HASH_SIZE].cast('Q')
+        keys = words[HASH_SIZE // 8 - 1::HASH_SIZE // 8].tolist()
+        words.release()
+        # built from the top down so the lowest height of a key wins
+        self.index = dict(zip(reversed(keys), range(self.count - 1, -1, -1)))
+        if len(self.index) < self.count:
+            index = self.index
+            for height, key in enumerate(keys):
+                if index[key] != height:
+                    self.add_collision(height)
+
+    def add_collision(self, height):
+        # caller holds the lock, the index keeps the first header with
+        # the key and every later one goes here
+        self.collisions[self.hash_at(height)] = height
+
+    def height_of(self, block_hash):
+        '''Returns the height of the header with block_hash or None'''
+        with self.lock:
+            if self.index is None:
+                self.build_index()
+            if block_hash in self.collisions:
+                return self.collisions[block_hash]
+            height = self.index.get(self.index_key(block_hash))
+            if height is None or self.hash_at(height) != block_hash:
+                return None
+            return height
+
+    def append(self, header):
+        '''Adds a raw 80 byte header on top of the chain'''
+        self.append_many([header])
+
+    def append_many(self, headers):
+        '''Adds raw 80 byte headers on top of the chain, each has to build
+        on the one before it'''
+        with self.lock:
+            tip = self.tip()
+            raws = []
+            hashes = []
+            for header in headers:
+                header = bytes(header)
+                if len(header) != HEADER_SIZE:
+                    raise ValueError('header is {} bytes'.format(len(header)))
+                if tip is not None and header[4:36][::-1] != tip:
+                    raise ValueError('header does not build on {}'.format(tip.hex()))
+                tip = hash256(header)[::-1]
+                raws.append(header)
+                hashes.append(tip)
+            self.headers_file.write(b''.join(raws))
+            self.hashes_file.write(b''.join(hashes))
+            start = self.count
+            self.count += len(raws)
+            if self.index is not None:
+                for height, block_hash in enumerate(hashes, start):
+                    key = self.index_key(block_hash)
+                    if key in self.index:
+                        self.add_collision(height)
+                    else:
+                        self.index[key] = height
+
+    def truncate(self, height):
+        '''Removes every header above height'''
+        with self.lock:
+            if height + 1 >= self.count:
+                return
+            self.headers_file.flush()
+            self.hashes_file.flush()
+            # cheaper to rebuild the index when it's needed again
+            self.index = None
+            self.count = height + 1
+            self.headers_file.truncate(self.count * HEADER_SIZE)
+            self.hashes_file.truncate(self.count * HASH_SIZE)
+            self.remap()
+
+    def flush(self):
+        with self.lock:
+            self.headers_file.flush()
+            os.fsync(self.headers_file.fileno())
+            self.hashes_file.flush()
+            os.fsync(self.hashes_file.fileno())
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.headers_file.close()
+            self.hashes_file.close()
+            for mapped in (self.headers_map, self.hashes_map):
+                if mapped is not None:
+                    try:
+                        mapped.close()
+                    except BufferError:
+                        pass
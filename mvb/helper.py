@@ -7,6 +7,10 @@ SIGHASH_SINGLE = 3
 BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
 TWO_WEEKS = 60 * 60 * 24 * 14
 MAX_TARGET = 0xffff * 256**(0x1d - 3)
+COINBASE_MATURITY = 100
+HALVING_INTERVAL = 210000
+# locktimes below this are heights, the rest are unix times
+LOCKTIME_THRESHOLD = 500000000
 
 def run(test):
     suite = TestSuite()
@@ -127,6 +131,50 @@ def bits_to_target(bits):
     # coefficient * 256**(exponent-3)
     return coefficient * 256**(exponent - 3)
 
+def target_to_bits(target):
+    '''Turns a target integer back into bits'''
+    raw_bytes = target.to_bytes(32, 'big')
+    # get rid of leading 0's
+    raw_bytes = raw_bytes.lstrip(b'\x00')
+    if raw_bytes[0] > 0x7f:
+        # if the first bit is 1, we have to start with 00
+        # as the coefficient would otherwise be read as negative
+        exponent = len(raw_bytes) + 1
+        coefficient = b'\x00' + raw_bytes[:2]
+    else:
+        # otherwise, we can show the first 3 bytes
+        # exponent is the number of digits in base-256
+        exponent = len(raw_bytes)
+        coefficient = raw_bytes[:3]
+    # short targets are padded on the right, the exponent keeps the value
+    coefficient = coefficient.ljust(3, b'\x00')
+    # we've truncated the number after the first 3 digits of base-256
+    new_bits = coefficient[::-1] + bytes([exponent])
+    return new_bits
+
+def calculate_new_bits(previous_bits, time_differential, max_target=MAX_TARGET):
+    '''Calculates the new bits given a 2016-block time differential
+    and the previous bits'''
+    # if the time differential is greater than 8 weeks, set to 8 weeks
+    if time_differential > TWO_WEEKS * 4:
+        time_differential = TWO_WEEKS * 4
+    # if the time differential is less than half a week, set to half a week
+    if time_differential < TWO_WEEKS // 4:
+        time_differential = TWO_WEEKS // 4
+    # the new target is the previous target * time differential / two weeks
+    new_target = bits_to_target(previous_bits) * time_differential // TWO_WEEKS
+    # if the new target is bigger than the easiest target, use that instead
+    if new_target > max_target:
+        new_target = max_target
+    return target_to_bits(new_target)
+
+def block_subsidy(height):
+    '''Returns the new coins a block at height may create, in satoshi'''
+    halvings = height // HALVING_INTERVAL
+    if halvings >= 64:
+        return 0
+    return (50 * 100000000) >> halvings
+
 def merkle_parent(hash1, hash2):
     '''Takes the binary hashes and calculates the hash256'''
     # return the hash256 of hash1 + hash2
@@ -168,6 +216,30 @@ def merkle_root(hashes):
     return current_level[0]
 
 
+def merkle_branch(hashes):
+    '''Takes a list of binary hashes and returns the sibling of the
+    first hash's node at each level, what merkle_root_from_branch needs
+    to get the root for any first hash. The first hash itself isn't used
+    '''
+    branch = []
+    # copy, merkle_parent_level pads the list it's given
+    current_level = list(hashes)
+    while len(current_level) > 1:
+        # the leftmost node's sibling is the 2nd one, padding included
+        branch.append(current_level[1])
+        current_level = merkle_parent_level(current_level)
+    return branch
+
+
+def merkle_root_from_branch(first, branch):
+    '''Returns the merkle root of a tree whose first hash is first, from
+    its merkle_branch, in one hash per level'''
+    current = first
+    for sibling in branch:
+        current = merkle_parent(current, sibling)
+    return current
+
+
 def bytes_to_bit_field(some_bytes):
     flag_bits = []
     # iterate over each byte of flags
@@ -0,0 +1,295 @@
+import heapq
+import time
+
+from helper import hash256
+from prevout import DictPrevouts
+
+# rough per-entry overhead of a pooled tx and its index entries, on top
+# of its serialized size
+MEMPOOL_ENTRY_USAGE = 1000
+DEFAULT_MAX_USAGE = 300 * 1000 * 1000
+DEFAULT_ANCESTOR_LIMIT = 25
+DEFAULT_DESCENDANT_LIMIT = 25
+
+
+class MempoolEntry:
+    '''A transaction in the pool with its fee, the in-pool transactions it
+    spends and spends it, and the totals of itself and its descendants
+    that eviction ranks it by'''
+
+    __slots__ = ('tx', 'tx_hash', 'fee', 'weight', 'usage', 'parents', 'children',
+                 'descendant_fee', 'descendant_weight', 'version')
+
+    def __init__(self, tx, tx_hash, raw, fee, weight):
+        self.tx = tx
+        self.tx_hash = tx_hash
+        self.fee = fee
+        self.weight = weight
+        self.usage = MEMPOOL_ENTRY_USAGE + len(raw)
+        self.parents = set()
+        self.children = set()
+        # self included
+        self.descendant_fee = fee
+        self.descendant_weight = weight
+        # bumped whenever the eviction score changes, older heap items
+        # are stale
+        self.version = 0
+
+    def score(self):
+        # the better of its own fee rate and its descendants', a parent
+        # isn't evicted ahead of the high fee child paying for it
+        return max(self.fee / self.weight, self.descendant_fee / self.descendant_weight)
+
+
+class Mempool:
+    '''Unconfirmed transactions keyed by hash.
+
+    spenders maps every outpoint spent in the pool to the spending tx, so
+    a double spend is a single lookup. Ancestors and descendants are
+    followed through the parents/children sets and limited in number.
+    When the estimated memory use goes over max_usage the entry with the
+    lowest descendant score goes first, along with its descendants; the
+    scores sit in a heap, with stale items skipped by version like the
+    TemplateBuilder does.
+
+    Transactions are checked with Tx.verify against their in-pool parents
+    and prevouts, a PrevoutProvider for the confirmed outputs (see
+    utxo.UtxoPrevouts). Conflicts are rejected, there is no replacement.
+    '''
+
+    def __init__(self, prevouts, max_usage=DEFAULT_MAX_USAGE,
+                 ancestor_limit=DEFAULT_ANCESTOR_LIMIT, descendant_limit=DEFAULT_DESCENDANT_LIMIT,
+                 verify=True):
+        self.prevouts = prevouts
+        self.max_usage = max_usage
+        self.ancestor_limit = ancestor_limit
+        self.descendant_limit = descendant_limit
+        self.verify = verify
+        self.entries = {}
+        self.spenders = {}
+        self.scores = []
+        self.usage = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.seconds = 0.0
+
+    def __contains__(self, tx_hash):
+        return tx_hash in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, tx_hash):
+        '''Returns the pooled Tx with tx_hash or None'''
+        entry = self.entries.get(tx_hash)
+        if entry is None:
+            return None
+        return entry.tx
+
+    def spender(self, outpoint):
+        '''Returns the hash of the pooled tx spending outpoint or None'''
+        return self.spenders.get(outpoint)
+
+    def ancestors(self, entry):
+        '''Returns the set of in-pool ancestors of entry, entry excluded'''
+        found = set()
+        stack = list(entry.parents)
+        while stack:
+            tx_hash = stack.pop()
+            if tx_hash not in found:
+                found.add(tx_hash)
+                stack.extend(self.entries[tx_hash].parents)
+        return found
+
+    def descendants(self, entry):
+        '''Returns the set of in-pool descendants of entry, entry excluded'''
+        found = set()
+        stack = list(entry.children)
+        while stack:
+            tx_hash = stack.pop()
+            if tx_hash not in found:
+                found.add(tx_hash)
+                stack.extend(self.entries[tx_hash].children)
+        return found
+
+    def add(self, tx):
+        '''Checks tx and puts it in the pool, returns its hash. Raises
+        ValueError saying why a tx isn't accepted'''
+        start = time.perf_counter()
+        try:
+            tx_hash = self.accept(tx)
+        except ValueError:
+            self.rejected += 1
+            raise
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.accepted += 1
+        return tx_hash
+
+    def accept(self, tx):
+        raw = tx.serialize()
+        tx_hash = hash256(raw)[::-1]
+        if tx_hash in self.entries:
+            raise ValueError('{} is already in the mempool'.format(tx_hash.hex()))
+        if tx.is_coinbase():
+            raise ValueError('coinbase transactions only go in blocks')
+        prevouts = DictPrevouts()
+        parents = set()
+        input_sum = 0
+        for tx_in in tx.tx_ins:
+            outpoint = (tx_in.prev_tx, tx_in.prev_index)
+            if outpoint in prevouts.outputs:
+                raise ValueError('{} spends {}:{} twice'.format(
+                    tx_hash.hex(), tx_in.prev_tx.hex(), tx_in.prev_index))
+            spender = self.spenders.get(outpoint)
+            if spender is not None:
+                raise ValueError('{}:{} is already spent by {}'.format(
+                    tx_in.prev_tx.hex(), tx_in.prev_index, spender.hex()))
+            parent = self.entries.get(tx_in.prev_tx)
+            if parent is not None:
+                if tx_in.prev_index >= len(parent.tx.tx_outs):
+                    raise ValueError('missing input {}:{}'.format(
+                        tx_in.prev_tx.hex(), tx_in.prev_index))
+                tx_out = parent.tx.tx_outs[tx_in.prev_index]
+                parents.add(parent.tx_hash)
+            else:
+                try:
+                    tx_out = self.prevouts.get(tx_in.prev_tx, tx_in.prev_index, tx.testnet)
+                except KeyError:
+                    raise ValueError('missing input {}:{}'.format(
+                        tx_in.prev_tx.hex(), tx_in.prev_index))
+            prevouts.add(tx_in.prev_tx, tx_in.prev_index, tx_out)
+            input_sum += tx_out.amount
+        fee = input_sum - sum(tx_out.amount for tx_out in tx.tx_outs)
+        if fee < 0:
+            raise ValueError('{} spends more than its inputs'.format(tx_hash.hex()))
+        entry = MempoolEntry(tx, tx_hash, raw, fee, len(raw) * 4 + tx.witness_size())
+        entry.parents = parents
+        ancestors = self.ancestors(entry)
+        if len(ancestors) + 1 > self.ancestor_limit:
+            raise ValueError('{} has too many unconfirmed ancestors'.format(tx_hash.hex()))
+        for ancestor in ancestors:
+            if len(self.descendants(self.entries[ancestor])) + 2 > self.descendant_limit:
+                raise ValueError('{} would have too many unconfirmed descendants'.format(
+                    ancestor.hex()))
+        # scripts last, they cost the most
+        if self.verify:
+            try:
+                valid = tx.verify(prevouts=prevouts)
+            except Exception as e:
+                # a malformed script can fail with anything, an unknown
+                # opcode is a KeyError
+                raise ValueError('{} has an invalid script: {!r}'.format(tx_hash.hex(), e)) from e
+            if not valid:
+                raise ValueError('{} has an invalid script'.format(tx_hash.hex()))
+        self.insert(entry, ancestors)
+        if self.usage > self.max_usage:
+            self.trim()
+            if tx_hash not in self.entries:
+                # it never really got in, it counts as rejected only
+                self.evicted -= 1
+                raise ValueError('mempool full, {} pays too little'.format(tx_hash.hex()))
+        return tx_hash
+
+    def insert(self, entry, ancestors):
+        self.entries[entry.tx_hash] = entry
+        for tx_in in entry.tx.tx_ins:
+            self.spenders[(tx_in.prev_tx, tx_in.prev_index)] = entry.tx_hash
+        for parent in entry.parents:
+            self.entries[parent].children.add(entry.tx_hash)
+        for tx_hash in ancestors:
+            ancestor = self.entries[tx_hash]
+            ancestor.descendant_fee += entry.fee
+            ancestor.descendant_weight += entry.weight
+            self.rescore(ancestor)
+        self.rescore(entry)
+        self.usage += entry.usage
+
+    def rescore(self, entry):
+        entry.version += 1
+        heapq.heappush(self.scores, (entry.score(), entry.version, entry.tx_hash))
+        # drop stale items once they outnumber the live ones
+        if len(self.scores) > 2 * len(self.entries) + 100:
+            self.scores = [item for item in self.scores
+                           if item[2] in self.entries and self.entries[item[2]].version == item[1]]
+            heapq.heapify(self.scores)
+
+    def remove_entry(self, entry):
+        '''Takes a single entry out, its descendants have to go first or
+        be confirmed'''
+        del self.entries[entry.tx_hash]
+        for tx_in in entry.tx.tx_ins:
+            outpoint = (tx_in.prev_tx, tx_in.prev_index)
+            if self.spenders.get(outpoint) == entry.tx_hash:
+                del self.spenders[outpoint]
+        for tx_hash in self.ancestors(entry):
+            ancestor = self.entries[tx_hash]
+            ancestor.descendant_fee -= entry.fee
+            ancestor.descendant_weight -= entry.weight
+            self.rescore(ancestor)
+        for parent in entry.parents:
+            self.entries[parent].children.discard(entry.tx_hash)
+        for child in entry.children:
+            self.entries[child].parents.discard(entry.tx_hash)
+        self.usage -= entry.usage
+
+    def remove(self, tx_hash):
+        '''Removes the tx with tx_hash and everything spending from it,
+        returns the removed hashes'''
+        entry = self.entries.get(tx_hash)
+        if entry is None:
+            return []
+        # deepest descendants first so every removal sees its ancestors
+        doomed = [self.entries[h] for h in self.descendants(entry)]
+        doomed.sort(key=lambda e: len(self.ancestors(e)), reverse=True)
+        doomed.append(entry)
+        for victim in doomed:
+            self.remove_entry(victim)
+        return [victim.tx_hash for victim in doomed]
+
+    def trim(self):
+        '''Evicts the lowest scoring packages until usage fits max_usage'''
+        while self.usage > self.max_usage and self.scores:
+            _, version, tx_hash = heapq.heappop(self.scores)
+            entry = self.entries.get(tx_hash)
+            if entry is None or entry.version != version:
+                continue
+            self.evicted += len(self.remove(tx_hash))
+
+    def remove_for_block(self, txs):
+        '''Takes out the transactions a new block confirmed and the ones
+        conflicting with it, with their descendants'''
+        for tx in txs:
+            tx_hash = tx.hash()
+            entry = self.entries.get(tx_hash)
+            if entry is not None:
+                # confirmed, its children stay with one parent fewer
+                for child in entry.children:
+                    self.entries[child].parents.discard(tx_hash)
+                entry.children = set()
+                self.remove_entry(entry)
+            if tx.is_coinbase():
+                continue
+            for tx_in in tx.tx_ins:
+                spender = self.spenders.get((tx_in.prev_tx, tx_in.prev_index))
+                if spender is not None:
+                    self.remove(spender)
+
+    def candidates(self):
+        '''Returns (tx, fee) for every pooled tx, what TemplateBuilder
+        takes'''
+        return [(entry.tx, entry.fee) for entry in self.entries.values()]
+
+    def stats(self):
+        '''Returns the pool size and usage and how many transactions were
+        accepted, rejected and evicted, with the accept rate in tx/s'''
+        return {
+            'size': len(self.entries),
+            'usage': self.usage,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'evicted': self.evicted,
+            'seconds': self.seconds,
+            'accept_rate': self.accepted / self.seconds if self.seconds else 0.0,
+        }
@@ -0,0 +1,137 @@
+import hashlib
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from block import Block
+
+NONCE_SPACE = 2**32
+# nonces per unit of work, a second or so of hashing in one process
+CHUNK_SIZE = 2**20
+
+
+def search_nonces(job):
+    '''Looks for a nonce in [start, stop) that gives prefix, the first 76
+    bytes of a header, a hash below target. Returns the nonce or None and
+    how many hashes were tried. Runs in the worker processes.
+
+    The first 64 bytes of the header are the same for every nonce, so
+    they are hashed once and the SHA256 state is copied for each try,
+    leaving a single 64-byte block to compress per nonce plus the second
+    round.'''
+    prefix, target, start, stop = job
+    midstate = hashlib.sha256(prefix[:64])
+    tail = prefix[64:]
+    # comparing the reversed hash to the big-endian target as bytes is
+    # the same as comparing the little-endian numbers
+    target = target.to_bytes(32, 'big')
+    # the most significant byte rules out nearly every miss on its own
+    top = target[0]
+    sha256 = hashlib.sha256
+    copy = midstate.copy
+    pack = struct.Struct('<I').pack
+    for nonce in range(start, stop):
+        h = copy()
+        h.update(tail + pack(nonce))
+        h256 = sha256(h.digest()).digest()
+        if h256[31] <= top and h256[::-1] < target:
+            return nonce, nonce - start + 1
+    return None, stop - start
+
+
+def roll_timestamp(block, roll):
+    '''Default header for the roll-th pass over the nonce space: the same
+    block a second later each time'''
+    return Block(block.version, block.prev_block, block.merkle_root,
+                 block.timestamp + roll, block.bits, block.nonce)
+
+
+class Miner:
+    '''Searches for proof of work on a pool of worker processes.
+
+    The work is split into units of CHUNK_SIZE nonces for one header. When
+    the 2**32 nonces of a header run out, roll(block, n) gives the header
+    for the next pass: by default the timestamp moves up a second, a block
+    template can roll the extranonce instead. Units go out in order so
+    workers never hash the same header and nonce twice.
+    '''
+
+    def __init__(self, workers=1, chunk_size=CHUNK_SIZE):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.executor = None
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.hashes = 0
+        self.seconds = 0.0
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def units(self, block, roll, target):
+        '''Yields (header, job) for every unit of work'''
+        passes = 0
+        while True:
+            header = roll(block, passes)
+            prefix = header.serialize()[:76]
+            for start in range(0, NONCE_SPACE, self.chunk_size):
+                stop = min(start + self.chunk_size, NONCE_SPACE)
+                yield header, (prefix, target, start, stop)
+            passes += 1
+
+    def mine(self, block, roll=roll_timestamp, max_hashes=None):
+        '''Returns a copy of block's header, rolled as needed, with a nonce
+        that meets its target, or None if max_hashes run out first'''
+        target = block.target()
+        units = self.units(block, roll, target)
+        start_time = time.perf_counter()
+        tried = 0
+        found = None
+        try:
+            if self.executor is None:
+                for header, job in units:
+                    if max_hashes is not None and tried >= max_hashes:
+                        break
+                    nonce, count = search_nonces(job)
+                    tried += count
+                    if nonce is not None:
+                        found = header, nonce
+                        break
+            else:
+                pending = {}
+                while found is None:
+                    # keep two units per worker queued
+                    while len(pending) < self.workers * 2 and (
+                            max_hashes is None or tried + len(pending) * self.chunk_size < max_hashes):
+                        header, job = next(units)
+                        pending[self.executor.submit(search_nonces, job)] = header
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        header = pending.pop(future)
+                        nonce, count = future.result()
+                        tried += count
+                        if nonce is not None and found is None:
+                            found = header, nonce
+                for future in pending:
+                    future.cancel()
+        finally:
+            self.hashes += tried
+            self.seconds += time.perf_counter() - start_time
+        if found is None:
+            return None
+        header, nonce = found
+        header.nonce = nonce.to_bytes(4, 'little')
+        return header
+
+    def stats(self):
+        '''Returns the hashes tried so far, the seconds spent and the
+        hashrate in hashes per second'''
+        return {
+            'hashes': self.hashes,
+            'seconds': self.seconds,
+            'hashrate': self.hashes / self.seconds if self.seconds else 0.0,
+        }
@@ -11,6 +11,7 @@ Adding two EC points results in a third point that is also on the curve. Point a
 '''
 
 class Point:
+  __slots__ = ('a', 'b', 'x', 'y')
 
   def __init__(self, x, y, a, b):
       self.a = a
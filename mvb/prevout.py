@@ -0,0 +1,40 @@
+from abc import ABC, abstractmethod
+
+
+class PrevoutProvider(ABC):
+    '''Looks up the output that an input spends. Backends implement get()
+    and can override prefetch() when they can load many outputs at once.'''
+
+    @abstractmethod
+    def get(self, prev_tx, prev_index, testnet=False):
+        '''Returns the TxOut at (prev_tx, prev_index), raises KeyError if
+        this backend doesn't know it'''
+
+    def prefetch(self, txs, testnet=False):
+        '''Gets ready to look up every input of txs'''
+        pass
+
+
+class DictPrevouts(PrevoutProvider):
+    '''In-memory backend keyed by (prev_tx, prev_index)'''
+
+    def __init__(self, outputs=None):
+        if outputs is None:
+            self.outputs = {}
+        else:
+            self.outputs = outputs
+
+    def __len__(self):
+        return len(self.outputs)
+
+    def add(self, prev_tx, prev_index, tx_out):
+        self.outputs[(prev_tx, prev_index)] = tx_out
+
+    def add_tx(self, tx):
+        '''Adds every output of tx'''
+        prev_tx = tx.hash()
+        for i, tx_out in enumerate(tx.tx_outs):
+            self.outputs[(prev_tx, i)] = tx_out
+
+    def get(self, prev_tx, prev_index, testnet=False):
+        return self.outputs[(prev_tx, prev_index)]
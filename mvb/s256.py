@@ -14,7 +14,8 @@ P = 2**256 - 2**32 - 977
 N = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141
 
 class S256Field(FieldElement):
-    
+  __slots__ = ()
+
   def __init__(self, num, prime=None):
     super().__init__(num=num, prime=P)
 
@@ -27,6 +28,7 @@ class S256Field(FieldElement):
 
 '''Public Keys in Elliptic Curves are Point coordinates in the form (x, y)'''
 class S256Point(Point):
+  __slots__ = ()
 
   def __init__(self, x, y, a=None, b=None):
     a, b = S256Field(A), S256Field(B)
@@ -113,6 +115,7 @@ G = S256Point(
 0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8)
 
 class Signature:
+  __slots__ = ('r', 's')
 
   def __init__(self, r, s):
     self.r = r
@@ -162,6 +165,7 @@ class Signature:
     return cls(r, s)
 
 class PrivateKey:
+  __slots__ = ('secret', 'point')
 
   def __init__(self, secret):
     self.secret = secret
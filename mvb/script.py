@@ -29,6 +29,7 @@ def p2sh_script(h160):
 LOGGER = getLogger(__name__)
 
 class Script:
+    __slots__ = ('cmds',)
 
     def __init__(self, cmds=None):
         if cmds is None:
@@ -219,4 +220,39 @@ class Script:
             # hash160 is the 2nd cmd
             h160 = self.cmds[1]
             # convert to p2sh address using h160_to_p2sh_address (remember testnet)
-            return h160_to_p2sh_address(h160, testnet)
\ No newline at end of file
+            return h160_to_p2sh_address(h160, testnet)
+
+
+class LazyScript(Script):
+    '''Script that keeps its raw serialization and only decodes the cmds
+    the first time they're accessed. Decoded cmds are treated as read-only,
+    assigning new cmds drops the raw bytes.'''
+    __slots__ = ('raw', '_cmds')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._cmds = None
+
+    @property
+    def cmds(self):
+        if self._cmds is None:
+            # reuse the eager parser on the length-prefixed raw bytes
+            stream = BytesIO(encode_varint(len(self.raw)) + self.raw)
+            self._cmds = Script.parse(stream).cmds
+        return self._cmds
+
+    @cmds.setter
+    def cmds(self, cmds):
+        self._cmds = cmds
+        self.raw = None
+
+    @classmethod
+    def parse(cls, s):
+        # get the length of the entire field and keep the bytes as they are
+        length = read_varint(s)
+        return cls(s.read(length))
+
+    def raw_serialize(self):
+        if self.raw is not None:
+            return self.raw
+        return super().raw_serialize()
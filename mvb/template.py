@@ -0,0 +1,283 @@
+import heapq
+import time
+
+from block import Block
+from cache import LRUCache
+from helper import (
+    block_subsidy,
+    hash256,
+    merkle_branch,
+    merkle_root_from_branch,
+)
+from miner import Miner
+from op import encode_num
+from script import Script
+from tx import Tx, TxIn, TxOut
+
+EXTRANONCE_SIZE = 8
+# merkle roots of the latest headers handed out that block() can still
+# complete, the miner only has work queued for the last one or two
+MAX_EXTRANONCES = 16
+MAX_BLOCK_WEIGHT = 4000000
+# legacy sigops count 4 each against this
+MAX_BLOCK_SIGOPS_COST = 80000
+WITNESS_SCALE_FACTOR = 4
+# kept free for the coinbase
+COINBASE_WEIGHT = 4000
+COINBASE_SIGOPS_COST = 400
+# give up after this many packages in a row didn't fit a nearly full block
+MAX_CONSECUTIVE_FAILURES = 1000
+# a block this close to max_weight counts as nearly full
+BLOCK_FULL_MARGIN = 4000
+
+
+class BlockTemplate:
+    '''A block waiting for proof of work: the transactions are fixed, the
+    coinbase carries an extranonce after the BIP34 height.
+
+    Rolling the extranonce only changes the coinbase, so the merkle branch
+    of the coinbase is worked out once and each new merkle root costs one
+    hash per level of the tree, log2(number of transactions), plus hashing
+    the coinbase, which is serialized once and patched in place.
+    roll() has the signature Miner.mine expects for its roll argument.
+    '''
+
+    def __init__(self, version, prev_block, timestamp, bits, height, txs,
+                 coinbase_amount, script_pubkey):
+        self.version = version
+        self.prev_block = prev_block
+        self.timestamp = timestamp
+        self.bits = bits
+        self.height = height
+        self.txs = txs
+        self.coinbase_amount = coinbase_amount
+        self.script_pubkey = script_pubkey
+        self.coinbase = self.make_coinbase(0)
+        raw = self.coinbase.serialize()
+        # the extranonce is the last push of the script_sig, which comes
+        # right before the 4 byte sequence of the only input
+        end = 4 + 1 + 32 + 4 + len(self.coinbase.tx_ins[0].script_sig.serialize())
+        self.coinbase_prefix = raw[:end - EXTRANONCE_SIZE]
+        self.coinbase_suffix = raw[end:]
+        # internal byte order, the coinbase slot is filled in per roll
+        self.branch = merkle_branch([b''] + [tx.hash()[::-1] for tx in txs])
+        # merkle root -> extranonce of the latest headers handed out
+        self.extranonces = LRUCache(maxsize=MAX_EXTRANONCES)
+
+    def make_coinbase(self, extranonce):
+        script_sig = Script([encode_num(self.height),
+                             extranonce.to_bytes(EXTRANONCE_SIZE, 'little')])
+        return Tx(1, [TxIn(b'\x00' * 32, 0xffffffff, script_sig)],
+                  [TxOut(self.coinbase_amount, self.script_pubkey)], 0)
+
+    def merkle_root(self, extranonce):
+        '''Returns the merkle root with extranonce in the coinbase, in the
+        order Block keeps it'''
+        coinbase_hash = hash256(
+            self.coinbase_prefix + extranonce.to_bytes(EXTRANONCE_SIZE, 'little')
+            + self.coinbase_suffix)
+        return merkle_root_from_branch(coinbase_hash, self.branch)[::-1]
+
+    def header(self, extranonce=0):
+        '''Returns the header to mine with extranonce in the coinbase'''
+        merkle_root = self.merkle_root(extranonce)
+        self.extranonces[merkle_root] = extranonce
+        return Block(self.version, self.prev_block, merkle_root,
+                     self.timestamp, self.bits, bytes(4))
+
+    def roll(self, block, n):
+        '''Header for the n-th pass over the nonce space'''
+        return self.header(n)
+
+    def block(self, header):
+        '''Returns the full block for a mined header from this template,
+        one of the last MAX_EXTRANONCES handed out'''
+        extranonce = self.extranonces.get(header.merkle_root)
+        if extranonce is None:
+            raise ValueError('{} is not a recent header of this template'.format(
+                header.merkle_root.hex()))
+        coinbase = self.make_coinbase(extranonce)
+        txs = [coinbase] + self.txs
+        return Block(header.version, header.prev_block, header.merkle_root,
+                     header.timestamp, header.bits, header.nonce,
+                     tx_hashes=[tx.hash() for tx in txs], txs=txs)
+
+    def mine(self, miner=None, max_hashes=None):
+        '''Mines the template and returns the full block, or None if
+        max_hashes run out first'''
+        own = miner is None
+        if own:
+            miner = Miner()
+        try:
+            header = miner.mine(self.header(0), roll=self.roll, max_hashes=max_hashes)
+        finally:
+            if own:
+                miner.close()
+        if header is None:
+            return None
+        return self.block(header)
+
+
+class Package:
+    '''A candidate transaction with the totals of itself and its
+    ancestors that aren't in the block yet'''
+
+    __slots__ = ('tx', 'tx_hash', 'fee', 'weight', 'sigops', 'parents', 'children',
+                 'ancestors', 'ancestor_fee', 'ancestor_weight', 'ancestor_sigops',
+                 'version', 'included')
+
+    def __init__(self, tx, fee):
+        self.tx = tx
+        # one serialization for both the hash and the weight
+        raw = tx.serialize()
+        self.tx_hash = hash256(raw)[::-1]
+        self.fee = fee
+        self.weight = len(raw) * 4 + tx.witness_size()
+        self.sigops = tx.sigop_count() * WITNESS_SCALE_FACTOR
+        self.parents = []
+        self.children = []
+        # ancestors not in the block yet, self included
+        self.ancestors = None
+        self.ancestor_fee = 0
+        self.ancestor_weight = 0
+        self.ancestor_sigops = 0
+        # bumped whenever the totals change, older heap items are stale
+        self.version = 0
+        self.included = False
+
+    def key(self):
+        # highest ancestor fee rate first, cross-multiplying would need a
+        # custom comparison and floats are plenty for ordering
+        return (-self.ancestor_fee / self.ancestor_weight, self.version)
+
+
+class TemplateBuilder:
+    '''Chooses transactions for a block by ancestor fee rate, the way
+    Bitcoin Core does: a transaction goes in together with whatever of its
+    ancestors isn't in yet, and packages are ranked by their combined fee
+    over combined weight, so a high fee child pays for its parents.
+
+    Packages sit in a heap. Putting one in the block lowers the totals of
+    its descendants, which get pushed again with their new fee rate; the
+    old heap items are recognised as stale by their version and skipped.
+    Weight and sigops are kept under the consensus limits minus what's
+    reserved for the coinbase.
+    '''
+
+    def __init__(self, max_weight=MAX_BLOCK_WEIGHT, max_sigops=MAX_BLOCK_SIGOPS_COST):
+        self.max_weight = max_weight - COINBASE_WEIGHT
+        self.max_sigops = max_sigops - COINBASE_SIGOPS_COST
+
+    def link(self, candidates):
+        '''Returns a Package per candidate (tx, fee), with the in-pool
+        parents and children filled in and the ancestor totals set'''
+        packages = {}
+        for tx, fee in candidates:
+            package = Package(tx, fee)
+            packages[package.tx_hash] = package
+        for package in packages.values():
+            seen = set()
+            for tx_in in package.tx.tx_ins:
+                parent = packages.get(tx_in.prev_tx)
+                if parent is not None and parent.tx_hash not in seen:
+                    seen.add(parent.tx_hash)
+                    package.parents.append(parent)
+                    parent.children.append(package)
+        for package in packages.values():
+            self.set_ancestors(package)
+        return packages
+
+    def set_ancestors(self, package):
+        # iterative so long chains don't hit the recursion limit
+        stack = [package]
+        while stack:
+            current = stack[-1]
+            if current.ancestors is not None:
+                stack.pop()
+                continue
+            missing = [p for p in current.parents if p.ancestors is None]
+            if missing:
+                stack.extend(missing)
+                continue
+            ancestors = {current.tx_hash: current}
+            for parent in current.parents:
+                ancestors.update(parent.ancestors)
+            current.ancestors = ancestors
+            current.ancestor_fee = sum(a.fee for a in ancestors.values())
+            current.ancestor_weight = sum(a.weight for a in ancestors.values())
+            current.ancestor_sigops = sum(a.sigops for a in ancestors.values())
+            stack.pop()
+
+    def select(self, candidates):
+        '''Returns the chosen transactions in a valid block order and their
+        total fees, weight and sigops'''
+        packages = self.link(candidates)
+        heap = [(package.key(), package.tx_hash) for package in packages.values()]
+        heapq.heapify(heap)
+        selected = []
+        fees = weight = sigops = 0
+        failures = 0
+        while heap:
+            (_, version), tx_hash = heapq.heappop(heap)
+            package = packages[tx_hash]
+            if package.included or version != package.version:
+                continue
+            if (weight + package.ancestor_weight > self.max_weight
+                    or sigops + package.ancestor_sigops > self.max_sigops):
+                failures += 1
+                if failures > MAX_CONSECUTIVE_FAILURES and weight > self.max_weight - BLOCK_FULL_MARGIN:
+                    break
+                continue
+            failures = 0
+            # parents before children: an ancestor has fewer ancestors
+            group = sorted(package.ancestors.values(), key=lambda a: len(a.ancestors))
+            for member in group:
+                member.included = True
+                selected.append(member.tx)
+            fees += package.ancestor_fee
+            weight += package.ancestor_weight
+            sigops += package.ancestor_sigops
+            self.update_descendants(group, heap)
+        return selected, fees, weight, sigops
+
+    def update_descendants(self, group, heap):
+        '''Takes the members of group out of the totals of every
+        descendant still waiting and requeues those'''
+        modified = {}
+        for member in group:
+            stack = list(member.children)
+            seen = set()
+            while stack:
+                descendant = stack.pop()
+                if descendant.included or descendant.tx_hash in seen:
+                    continue
+                seen.add(descendant.tx_hash)
+                if member.tx_hash in descendant.ancestors:
+                    del descendant.ancestors[member.tx_hash]
+                    descendant.ancestor_fee -= member.fee
+                    descendant.ancestor_weight -= member.weight
+                    descendant.ancestor_sigops -= member.sigops
+                    modified[descendant.tx_hash] = descendant
+                stack.extend(descendant.children)
+        for descendant in modified.values():
+            descendant.version += 1
+            heapq.heappush(heap, (descendant.key(), descendant.tx_hash))
+
+    def build(self, candidates, prev_block, height, bits, timestamp, script_pubkey,
+              version=0x20000000):
+        '''Returns a BlockTemplate on top of prev_block filled from the
+        candidates, a list of (tx, fee), and a report with the total fees,
+        weight and sigops of the chosen transactions and the seconds the
+        selection took'''
+        start = time.perf_counter()
+        txs, fees, weight, sigops = self.select(candidates)
+        seconds = time.perf_counter() - start
+        template = BlockTemplate(version, prev_block, timestamp, bits, height, txs,
+                                 block_subsidy(height) + fees, script_pubkey)
+        return template, {
+            'txs': len(txs),
+            'fees': fees,
+            'weight': weight,
+            'sigops': sigops,
+            'seconds': seconds,
+        }
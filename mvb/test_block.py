@@ -1,7 +1,10 @@
 import unittest
 from io import BytesIO
 from block import Block
+from fixtures import make_block, make_block_txs
 from point import Point
+from tx import LazyTx
+
 
 class BlockTest(unittest.TestCase):
 
@@ -104,5 +107,38 @@ class BlockTest(unittest.TestCase):
         block.tx_hashes = hashes
         self.assertTrue(block.validate_merkle_root())
 
+    def test_parse_full(self):
+        txs = make_block_txs()
+        raw = make_block(txs).serialize_full()
+        block = Block.parse_full(BytesIO(raw))
+        self.assertEqual([tx.id() for tx in block.txs], [tx.id() for tx in txs])
+        self.assertTrue(block.validate_merkle_root())
+        self.assertEqual(block.serialize_full(), raw)
+
+    def test_parse_full_segwit(self):
+        txs = make_block_txs()
+        txs[1].tx_ins[0].witness = [b'\xaa' * 72, b'\xbb' * 33]
+        raw = make_block(txs).serialize_full()
+        block = Block.parse_full(BytesIO(raw))
+        self.assertEqual(block.txs[1].tx_ins[0].witness, [b'\xaa' * 72, b'\xbb' * 33])
+        self.assertEqual([tx.id() for tx in block.txs], [tx.id() for tx in txs])
+        self.assertTrue(block.validate_merkle_root())
+        self.assertEqual(block.serialize_full(), raw)
+        lazy = Block.parse_full(BytesIO(raw), lazy=True)
+        self.assertIsInstance(lazy.txs[1], LazyTx)
+        self.assertEqual(lazy.txs[1].weight(), txs[1].weight())
+        self.assertEqual(lazy.serialize_full(), raw)
+
+    def test_iter_txs(self):
+        txs = make_block_txs()
+        stream = BytesIO(make_block(txs).serialize_full())
+        block = Block.parse(stream)
+        for i, tx in enumerate(block.iter_txs(stream, lazy=True)):
+            self.assertIsInstance(tx, LazyTx)
+            self.assertEqual(len(block.tx_hashes), i + 1)
+            self.assertEqual(tx.hash(), txs[i].hash())
+        self.assertTrue(block.validate_merkle_root())
+        self.assertIsNone(block.txs)
+
 if __name__ == "__main__":
   unittest.main()
\ No newline at end of file
@@ -0,0 +1,120 @@
+import tempfile
+import unittest
+from block import Block
+from blockindex import BlockIndex, block_work, get_skip_height
+from fixtures import make_headers
+from headerstore import HeaderStore
+from helper import bits_to_target
+
+EASY_BITS = bytes.fromhex('ffff7f20')
+HARD_BITS = bytes.fromhex('ffff7f1f')
+
+
+class BlockIndexTest(unittest.TestCase):
+
+    def test_block_work(self):
+        self.assertEqual(block_work(bits_to_target(bytes.fromhex('ffff001d'))), 0x100010001)
+        self.assertEqual(block_work(2**256 - 1), 1)
+
+    def test_best_tip(self):
+        index = BlockIndex()
+        main = make_headers(10, b'\x00' * 32, EASY_BITS)
+        for block in main:
+            index.add(block)
+        self.assertEqual(len(index), 10)
+        tip = index[main[-1].hash()]
+        self.assertIs(index.best, tip)
+        self.assertEqual(tip.height, 9)
+        self.assertEqual(tip.chainwork, 10 * block_work(main[0].target()))
+        # a longer branch with the same work per block doesn't win a tie
+        fork = make_headers(5, main[4].hash(), EASY_BITS, tag=1)
+        for block in fork:
+            index.add(block)
+        self.assertIs(index.best, tip)
+        # two harder blocks outweigh five easy ones
+        heavy = make_headers(2, main[4].hash(), HARD_BITS, tag=2)
+        for block in heavy:
+            index.add(block)
+        self.assertEqual(index.best.hash, heavy[-1].hash())
+        self.assertEqual(index.best.height, 6)
+        with self.assertRaises(KeyError):
+            index.add(make_headers(1, b'\x01' * 32, EASY_BITS)[0])
+
+    def test_fork_point(self):
+        index = BlockIndex()
+        main = make_headers(10, b'\x00' * 32, EASY_BITS)
+        fork = make_headers(3, main[3].hash(), EASY_BITS, tag=1)
+        for block in main + fork:
+            index.add(block)
+        a = index[main[-1].hash()]
+        b = index[fork[-1].hash()]
+        self.assertIs(index.fork_point(a, b), index[main[3].hash()])
+        self.assertIs(index.fork_point(b, a), index[main[3].hash()])
+        self.assertIs(index.fork_point(a, index[main[5].hash()]), index[main[5].hash()])
+        disconnect, connect = index.reorg_path(a, b)
+        self.assertEqual([e.hash for e in disconnect], [blk.hash() for blk in main[:3:-1]])
+        self.assertEqual([e.hash for e in connect], [blk.hash() for blk in fork])
+        # a second chain from its own genesis shares nothing
+        other = make_headers(2, b'\x00' * 32, EASY_BITS, tag=3)
+        for block in other:
+            index.add(block)
+        self.assertIsNone(index.fork_point(a, index[other[-1].hash()]))
+
+    def test_get_ancestor(self):
+        index = BlockIndex()
+        main = make_headers(3000, b'\x00' * 32, EASY_BITS)
+        for block in main:
+            index.add(block)
+        tip = index.best
+        for height in (0, 1, 2, 17, 1024, 2047, 2998, 2999):
+            self.assertEqual(tip.get_ancestor(height).hash, main[height].hash())
+        self.assertIsNone(tip.get_ancestor(3000))
+        self.assertIsNone(tip.get_ancestor(-1))
+        for height in range(2, 3000):
+            self.assertLess(get_skip_height(height), height)
+            self.assertEqual(index[main[height].hash()].skip.height, get_skip_height(height))
+        # forks deep in the chain are found through the skip pointers
+        fork = make_headers(2995, main[5].hash(), EASY_BITS, tag=1)
+        for block in fork:
+            index.add(block)
+        self.assertIs(index.fork_point(tip, index[fork[-1].hash()]), index[main[5].hash()])
+
+    def test_median_time_past(self):
+        index = BlockIndex()
+        timestamps = [1296688602 + 600 * i for i in range(20)]
+        # out of order timestamps
+        timestamps[15] += 10000
+        prev_block = b'\x00' * 32
+        for timestamp in timestamps:
+            block = Block(1, prev_block, bytes(32), timestamp, EASY_BITS, bytes(4))
+            entry = index.add(block)
+            prev_block = block.hash()
+        self.assertEqual(entry.get_ancestor(0).median_time_past, timestamps[0])
+        self.assertEqual(entry.get_ancestor(4).median_time_past, timestamps[2])
+        # median of 9..19 with 15 moved to the end
+        self.assertEqual(entry.median_time_past, timestamps[14])
+
+    def test_locator(self):
+        index = BlockIndex()
+        blocks = make_headers(100, b'\x00' * 32, EASY_BITS)
+        for block in blocks:
+            index.add(block)
+        heights = [index[h].height for h in index.locator()]
+        self.assertEqual(heights, [99, 98, 97, 96, 95, 94, 93, 92, 91, 90, 89, 88, 86, 82, 74, 58, 26, 0])
+        self.assertEqual(index.locator(index[blocks[0].hash()]), [blocks[0].hash()])
+
+    def test_load(self):
+        blocks = make_headers(20, b'\x00' * 32, EASY_BITS)
+        with tempfile.TemporaryDirectory() as directory:
+            store = HeaderStore(directory)
+            store.append_many([block.serialize() for block in blocks])
+            index = BlockIndex()
+            index.load(store)
+            store.close()
+        self.assertEqual(index.best.hash, blocks[-1].hash())
+        self.assertEqual(index.best.height, 19)
+        self.assertEqual(index.best.timestamp, blocks[-1].timestamp)
+        self.assertEqual(index.best.bits, EASY_BITS)
+
+if __name__ == "__main__":
+    unittest.main()
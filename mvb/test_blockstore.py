@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from io import BytesIO
+from block import Block
+from blockstore import MIN_BLOCKS_TO_KEEP, BlockFilePrevouts, BlockStore
+from fixtures import make_blocks
+from helper import hash256
+from tx import TxFetcher
+from undo import BlockUndo, UndoStore
+
+
+def make_block_hash(raw):
+    return hash256(raw[:80])[::-1]
+
+
+class BlockStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_write_read(self):
+        raws = make_blocks(5)
+        # small files so the store has to roll over
+        store = BlockStore(self.dir.name, max_file_size=2 * len(raws[0]) + 16)
+        locations = [store.write_block(raw, height) for height, raw in enumerate(raws)]
+        self.assertEqual([location[0] for location in locations], [0, 0, 1, 1, 2])
+        # writing it again finds the existing copy
+        self.assertEqual(store.write_block(raws[3]), locations[3])
+        for raw, location in zip(raws, locations):
+            view = store.read(*location)
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(bytes(view), raw)
+            view.release()
+        block = store.get_block(make_block_hash(raws[2]))
+        self.assertEqual(block.serialize_full(), raws[2])
+        self.assertEqual(list(store.scan(1)), [location[1:] for location in locations[2:4]])
+        store.close()
+        store = BlockStore(self.dir.name, max_file_size=2 * len(raws[0]) + 16)
+        self.assertEqual(store.locate(make_block_hash(raws[4])), locations[4])
+        self.assertEqual(bytes(store.read_block(make_block_hash(raws[4]))), raws[4])
+        self.assertIsNone(store.read_block(b'\x00' * 32))
+        store.close()
+
+    def test_txindex(self):
+        raws = make_blocks(3)
+        store = BlockStore(self.dir.name, txindex=True)
+        for height, raw in enumerate(raws):
+            store.write_block(raw, height)
+        store.flush()
+        block = Block.parse_full(BytesIO(raws[1]))
+        tx = block.txs[0]
+        self.assertEqual(bytes(store.read_tx(tx.id())), tx.serialize())
+        self.assertIsNone(store.read_tx('00' * 32))
+        self.assertEqual(len(store.txindex), 3)
+        prevouts = BlockFilePrevouts(store)
+        self.assertEqual(prevouts.get(tx.hash(), 0).amount, 5000000000)
+        with self.assertRaises(KeyError):
+            prevouts.get(tx.hash(), 1)
+        TxFetcher.use_blocks(store)
+        try:
+            self.assertEqual(TxFetcher.fetch(tx.id()).serialize(), tx.serialize())
+        finally:
+            TxFetcher.detach_blocks()
+            TxFetcher.cache.pop(tx.id(), None)
+        self.assertIsNone(TxFetcher.blocks)
+        store.close()
+
+    def test_build_txindex(self):
+        raws = make_blocks(3)
+        store = BlockStore(self.dir.name)
+        for height, raw in enumerate(raws[:2]):
+            store.write_block(raw, height)
+        with self.assertRaises(ValueError):
+            TxFetcher.use_blocks(store)
+        store.build_txindex(batch_size=1)
+        self.assertEqual(len(store.txindex), 2)
+        store.write_block(raws[2], 2)
+        store.build_txindex()
+        self.assertEqual(len(store.txindex), 3)
+        store.close()
+
+    def test_prune(self):
+        raws = make_blocks(6)
+        hashes = [make_block_hash(raw) for raw in raws]
+        store = BlockStore(self.dir.name, max_file_size=2 * len(raws[0]) + 16,
+                           txindex=True, prune_depth=MIN_BLOCKS_TO_KEEP)
+        undo_store = UndoStore(os.path.join(self.dir.name, 'undo.db'))
+        for height, raw in enumerate(raws):
+            store.write_block(raw, height)
+            undo_store.put(hashes[height], height, BlockUndo())
+        coinbase_id = Block.parse_full(BytesIO(raws[0])).txs[0].id()
+        self.assertIsNotNone(store.read_tx(coinbase_id))
+        tip = MIN_BLOCKS_TO_KEEP + 3
+        self.assertEqual(store.prune(tip, undo_store, reorg_window=MIN_BLOCKS_TO_KEEP - 1), [0])
+        self.assertFalse(os.path.exists(store.path(0)))
+        self.assertTrue(store.is_pruned(hashes[0]))
+        self.assertIsNone(store.read_block(hashes[1]))
+        self.assertIsNone(store.read_tx(coinbase_id))
+        self.assertFalse(store.txindex.is_indexed(hashes[1]))
+        self.assertTrue(store.txindex.is_indexed(hashes[2]))
+        self.assertEqual(bytes(store.read_block(hashes[2])), raws[2])
+        # headers are still there
+        self.assertEqual(store.get_header(hashes[1]).serialize(), raws[1][:80])
+        self.assertNotIn(hashes[3], undo_store)
+        self.assertIn(hashes[4], undo_store)
+        store.close()
+        store = BlockStore(self.dir.name, prune_depth=MIN_BLOCKS_TO_KEEP)
+        self.assertIsNone(store.locate(hashes[0]))
+        self.assertEqual(store.prune(tip), [])
+        store.close()
+        undo_store.close()
+
+    def test_prune_reorg_window(self):
+        with self.assertRaises(ValueError):
+            BlockStore(self.dir.name, prune_depth=1)
+        raws = make_blocks(6)
+        hashes = [make_block_hash(raw) for raw in raws]
+        store = BlockStore(self.dir.name, max_file_size=2 * len(raws[0]) + 16,
+                           prune_depth=MIN_BLOCKS_TO_KEEP)
+        undo_store = UndoStore(os.path.join(self.dir.name, 'undo.db'))
+        for height, raw in enumerate(raws):
+            store.write_block(raw, height)
+            undo_store.put(hashes[height], height, BlockUndo())
+        tip = MIN_BLOCKS_TO_KEEP + 3
+        # deeper than prune_depth but blocks 1 and up are in the window
+        self.assertEqual(store.prune(tip, undo_store, reorg_window=MIN_BLOCKS_TO_KEEP + 2), [])
+        self.assertEqual(store.prune(tip, undo_store, reorg_window=MIN_BLOCKS_TO_KEEP + 1), [0])
+        # every block that can still be rolled back has its body
+        for block_hash in hashes:
+            if block_hash in undo_store:
+                self.assertIsNotNone(store.read_block(block_hash))
+        self.assertIn(hashes[2], undo_store)
+        store.close()
+        undo_store.close()
+
+    def test_migrate(self):
+        raws = make_blocks(3)
+        hashes = [make_block_hash(raw) for raw in raws]
+        store = BlockStore(self.dir.name)
+        for height, raw in enumerate(raws):
+            store.write_block(raw, height)
+        store.close()
+        # the blocks table as it was before the header column
+        db = sqlite3.connect(os.path.join(self.dir.name, 'index.db'))
+        with db:
+            db.execute('CREATE TABLE old AS SELECT hash, file, offset, length, height FROM blocks')
+            db.execute('DROP TABLE blocks')
+            db.execute('ALTER TABLE old RENAME TO blocks')
+            db.execute('PRAGMA user_version = 0')
+        db.close()
+        store = BlockStore(self.dir.name)
+        self.assertEqual(store.get_header(hashes[1]).serialize(), raws[1][:80])
+        self.assertEqual(bytes(store.read_block(hashes[2])), raws[2])
+        store.write_block(make_blocks(4)[3], 3)
+        store.flush()
+        store.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import threading
+import time
+import unittest
+from cache import LRUCache
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        # touching a makes b the least recently used
+        self.assertEqual(cache['a'], 1)
+        cache['c'] = 3
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_get_or_load(self):
+        cache = LRUCache()
+        self.assertEqual(cache.get_or_load('a', lambda: 1), 1)
+        self.assertEqual(cache.get_or_load('a', lambda: 2), 1)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(sum(stats['latency'].values()), 1)
+
+    def test_single_flight(self):
+        cache = LRUCache()
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait()
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_load('a', loader)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        # give every thread time to join the flight
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 8)
+
+    def test_load_error(self):
+        cache = LRUCache()
+
+        def loader():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            cache.get_or_load('a', loader)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.get_or_load('a', lambda: 1), 1)
+
+    def test_load_interrupted(self):
+        cache = LRUCache()
+
+        def loader():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            cache.get_or_load('a', loader)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.get_or_load('a', lambda: 1), 1)
+
+if __name__ == "__main__":
+    unittest.main()
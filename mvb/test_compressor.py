@@ -0,0 +1,55 @@
+import unittest
+from io import BytesIO
+from compressor import (
+    compress_amount,
+    compress_script,
+    decompress_amount,
+    encode_compact_int,
+    read_compact_int,
+    read_compressed_script,
+)
+from s256 import G
+from script import Script, p2pkh_script, p2sh_script
+
+class CompressorTest(unittest.TestCase):
+
+    def test_compact_int(self):
+        for n in (0, 1, 127, 128, 255, 16511, 16512, 2**32, 2**64):
+            raw = encode_compact_int(n)
+            self.assertEqual(read_compact_int(BytesIO(raw)), n)
+        self.assertEqual(len(encode_compact_int(127)), 1)
+        self.assertEqual(len(encode_compact_int(16511)), 2)
+
+    def test_amount(self):
+        self.assertEqual(compress_amount(0), 0)
+        self.assertEqual(compress_amount(1), 1)
+        self.assertEqual(compress_amount(100000000), 9)
+        self.assertEqual(compress_amount(5000000000), 50)
+        self.assertEqual(compress_amount(2100000000000000), 0x1406f40)
+        for n in (0, 1, 9, 10, 123456789, 5000000000, 10**9, 10**10 + 1, 2100000000000000):
+            self.assertEqual(decompress_amount(compress_amount(n)), n)
+
+    def test_script(self):
+        scripts = [
+            p2pkh_script(b'\x11' * 20).raw_serialize(),
+            p2sh_script(b'\x22' * 20).raw_serialize(),
+            Script([(3 * G).sec(compressed=True), 0xac]).raw_serialize(),
+            Script([(3 * G).sec(compressed=False), 0xac]).raw_serialize(),
+            Script([(4 * G).sec(compressed=False), 0xac]).raw_serialize(),
+            Script([0x00, b'\x33' * 20]).raw_serialize(),
+            b'',
+        ]
+        sizes = [21, 21, 33, 33, 33, 23, 1]
+        for raw, size in zip(scripts, sizes):
+            compressed = compress_script(raw)
+            self.assertEqual(len(compressed), size)
+            self.assertEqual(read_compressed_script(BytesIO(compressed)), raw)
+
+    def test_invalid_pubkey(self):
+        raw = b'\x41\x04' + b'\x01' * 64 + b'\xac'
+        compressed = compress_script(raw)
+        self.assertEqual(len(compressed), 68)
+        self.assertEqual(read_compressed_script(BytesIO(compressed)), raw)
+
+if __name__ == "__main__":
+    unittest.main()
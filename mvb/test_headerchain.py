@@ -0,0 +1,95 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import headerchain
+from fixtures import REGTEST_BITS, REGTEST_MAX_TARGET, START_TIME, make_chain, mine_header
+from headerchain import HeaderChainValidator
+from headerstore import HeaderStore
+from helper import (
+    bits_to_target,
+    calculate_new_bits,
+    hash256,
+    target_to_bits,
+)
+
+
+class HeaderChainValidatorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.headers = make_chain(2020)
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = HeaderStore(self.dir.name)
+        self.validator = HeaderChainValidator(self.store, max_target=REGTEST_MAX_TARGET)
+
+    def tearDown(self):
+        self.validator.close()
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_target_to_bits(self):
+        for bits in ('ffff001d', 'ffff7f20', '30c31b18', '54d80118'):
+            bits = bytes.fromhex(bits)
+            self.assertEqual(target_to_bits(bits_to_target(bits)), bits)
+        self.assertEqual(target_to_bits(0x1234), bytes.fromhex('00341202'))
+        self.assertEqual(target_to_bits(0x80), bytes.fromhex('00800002'))
+
+    def test_calculate_new_bits(self):
+        prev_bits = bytes.fromhex('54d80118')
+        want = bytes.fromhex('00157617')
+        self.assertEqual(calculate_new_bits(prev_bits, 302400), want)
+
+    def test_check_across_retarget(self):
+        self.assertNotEqual(self.headers[2016][72:76], REGTEST_BITS)
+        hashes = self.validator.check_and_append(self.headers[:1000])
+        self.assertEqual(hashes, [self.store.hash_at(h) for h in range(1000)])
+        # the retarget needs the start of the period from the store
+        self.validator.check_and_append(self.headers[1000:])
+        self.assertEqual(len(self.store), 2020)
+
+    def test_parallel(self):
+        validator = HeaderChainValidator(workers=2, max_target=REGTEST_MAX_TARGET)
+        with patch.object(headerchain, 'HASH_CHUNK', 300):
+            hashes = validator.check(self.headers)
+        validator.close()
+        self.assertEqual(hashes, [hash256(h)[::-1] for h in self.headers])
+
+    def test_bad_retarget(self):
+        headers = self.headers[:2016]
+        headers.append(mine_header(hash256(headers[-1]), START_TIME + 600 * 2016))
+        with self.assertRaises(ValueError):
+            self.validator.check(headers)
+        # the same header checks out when retargets are off
+        validator = HeaderChainValidator(max_target=REGTEST_MAX_TARGET, retarget=False)
+        self.assertEqual(len(validator.check(headers)), 2017)
+
+    def test_bad_headers(self):
+        self.validator.check_and_append(self.headers[:20])
+        prev_block = hash256(self.headers[19])
+        tip_time = START_TIME + 600 * 19
+        bad = {
+            'linkage': mine_header(b'\x01' * 32, tip_time + 600),
+            'bits': mine_header(prev_block, tip_time + 600, bytes.fromhex('ffff7f1f')),
+            'too easy': mine_header(prev_block, tip_time + 600, bytes.fromhex('ffff7f21')),
+            'median time': mine_header(prev_block, tip_time - 600 * 6),
+            'future': mine_header(prev_block, tip_time + 3 * 60 * 60),
+        }
+        for reason, header in bad.items():
+            with self.assertRaises(ValueError, msg=reason):
+                self.validator.check([header], 20, now=tip_time)
+        # not enough work
+        header = bytearray(mine_header(prev_block, tip_time + 600))
+        while int.from_bytes(hash256(bytes(header)), 'little') < REGTEST_MAX_TARGET:
+            header[76] += 1
+        with self.assertRaises(ValueError):
+            self.validator.check([bytes(header)], 20, now=tip_time)
+        self.assertEqual(len(self.validator.check([mine_header(prev_block, tip_time + 600)], 20, now=tip_time)), 1)
+        with self.assertRaises(ValueError):
+            self.validator.check([header[:79]], 20)
+        self.assertEqual(len(self.store), 20)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from block import Block
+from fixtures import GENESIS_TIME, link_headers
+from headerstats import HeaderColumns, raw_columns
+from headerstore import HeaderStore
+
+
+def make_varied_headers(count):
+    '''Returns count linked Blocks with a mix of versions, bits and
+    uneven block intervals'''
+    versions = [0x20000002, 0x20000010, 0x20000012, 4, 0x30000002]
+    bits = [bytes.fromhex('ffff001d'), bytes.fromhex('30c31b18'), bytes.fromhex('54d80118')]
+    blocks = []
+    timestamp = GENESIS_TIME
+    for i in range(count):
+        timestamp += 300 + (i * 7919) % 700 - (200 if i % 13 == 0 else 0)
+        blocks.append(Block(versions[i % len(versions)], None, i.to_bytes(32, 'big'),
+                            timestamp, bits[i // 1000 % len(bits)], i.to_bytes(4, 'little')))
+    return link_headers(blocks)
+
+
+class HeaderColumnsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.blocks = make_varied_headers(5000)
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = HeaderStore(self.dir.name)
+        self.store.append_many([block.serialize() for block in self.blocks])
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_columns(self):
+        columns = HeaderColumns.from_store(self.store, 100, 200)
+        self.assertEqual(len(columns), 100)
+        for i, block in enumerate(self.blocks[100:200]):
+            self.assertEqual(columns.version[i], block.version)
+            self.assertEqual(columns.timestamp[i], block.timestamp)
+            self.assertEqual(columns.bits[i].tobytes(), block.bits)
+            self.assertEqual(columns.nonce[i].tobytes(), block.nonce)
+            self.assertEqual(columns.hash_bytes(i), block.hash())
+            self.assertEqual(columns.bip9()[i], block.bip9())
+            self.assertEqual(columns.bip91()[i], block.bip91())
+            self.assertEqual(columns.bip141()[i], block.bip141())
+            self.assertAlmostEqual(columns.difficulty()[i], block.difficulty(), delta=block.difficulty() * 1e-12)
+
+    def test_window_counts(self):
+        columns = HeaderColumns.from_store(self.store, 1000)
+        starts, counts = columns.window_counts(columns.signalling(4))
+        self.assertEqual(list(starts), [0, 2016, 4032])
+        for window_start, count in zip(starts, counts):
+            want = sum(1 for height in range(max(window_start, 1000), min(window_start + 2016, 5000))
+                       if self.blocks[height].bip9() and self.blocks[height].bip91())
+            self.assertEqual(count, want)
+
+    def test_retargets(self):
+        columns = raw_columns([block.serialize() for block in self.blocks])
+        heights, difficulty = columns.retargets()
+        self.assertEqual(list(heights), [0, 1000, 2000, 3000, 4000])
+        self.assertEqual(difficulty[0], 1.0)
+        self.assertEqual(difficulty[1], self.blocks[1000].difficulty())
+
+    def test_interval_stats(self):
+        columns = HeaderColumns.from_store(self.store)
+        stats = columns.interval_stats()
+        intervals = [b.timestamp - a.timestamp for a, b in zip(self.blocks, self.blocks[1:])]
+        self.assertEqual(stats['count'], 4999)
+        self.assertAlmostEqual(stats['mean'], sum(intervals) / len(intervals))
+        self.assertEqual(stats['min'], min(intervals))
+        self.assertEqual(stats['max'], max(intervals))
+        starts, means = stats['windows']
+        self.assertEqual(list(starts), [0, 2016, 4032])
+        self.assertAlmostEqual(means[1], sum(intervals[2015:4031]) / 2016)
+        self.assertEqual(HeaderColumns.from_store(self.store, 10, 11).interval_stats()['count'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from fixtures import make_headers
+from headerstore import HeaderStore
+from helper import hash256
+
+
+def raw_headers(count):
+    '''Returns count raw headers that build on each other'''
+    return [block.serialize() for block in make_headers(count)]
+
+
+class HeaderStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_append_get(self):
+        headers = raw_headers(10)
+        store = HeaderStore(self.dir.name)
+        self.assertIsNone(store.tip())
+        store.append(headers[0])
+        store.append_many(headers[1:])
+        self.assertEqual(len(store), 10)
+        self.assertEqual(bytes(store.raw(3)), headers[3])
+        block = store.get(7)
+        self.assertEqual(block.serialize(), headers[7])
+        self.assertEqual(store.hash_at(7), block.hash())
+        self.assertEqual(store.height_of(block.hash()), 7)
+        self.assertEqual(store.tip(), store.get(9).hash())
+        self.assertIsNone(store.height_of(b'\x00' * 32))
+        with self.assertRaises(IndexError):
+            store.raw(10)
+        with self.assertRaises(ValueError):
+            store.append(headers[5])
+        store.close()
+        store = HeaderStore(self.dir.name)
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.height_of(block.hash()), 7)
+        store.close()
+
+    def test_truncate(self):
+        headers = raw_headers(10)
+        store = HeaderStore(self.dir.name)
+        store.append_many(headers)
+        tip = store.tip()
+        store.truncate(4)
+        self.assertEqual(len(store), 5)
+        self.assertIsNone(store.height_of(tip))
+        store.append_many(headers[5:])
+        self.assertEqual(store.tip(), tip)
+        store.close()
+
+    def test_recover(self):
+        headers = raw_headers(5)
+        store = HeaderStore(self.dir.name)
+        store.append_many(headers)
+        store.close()
+        # a crash after writing a header and half of the next one but
+        # before writing their hashes
+        with open(os.path.join(self.dir.name, 'hashes.dat'), 'r+b') as f:
+            f.truncate(3 * 32)
+        with open(os.path.join(self.dir.name, 'headers.dat'), 'ab') as f:
+            f.write(headers[0][:40])
+        store = HeaderStore(self.dir.name)
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store.height_of(store.get(4).hash()), 4)
+        store.close()
+
+    def test_index_collisions(self):
+        headers = raw_headers(6)
+        store = HeaderStore(self.dir.name)
+        store.append_many(headers[:4])
+        store.close()
+        # give height 1 the same index key, the last 8 bytes, as height 0
+        path = os.path.join(self.dir.name, 'hashes.dat')
+        with open(path, 'r+b') as f:
+            tail = f.read(32)[24:]
+            f.seek(32 + 24)
+            f.write(tail)
+        store = HeaderStore(self.dir.name)
+        hashes = [store.hash_at(h) for h in range(4)]
+        self.assertEqual([store.height_of(h) for h in hashes], [0, 1, 2, 3])
+        self.assertIsNone(store.height_of(hashes[0][:24] + b'\xff' * 8))
+        # a header appended onto a key that's taken is kept apart as well
+        new_hash = hash256(headers[4])[::-1]
+        store.index[store.index_key(new_hash)] = 2
+        store.append(headers[4])
+        self.assertEqual(store.height_of(new_hash), 4)
+        self.assertEqual(store.height_of(hashes[2]), 2)
+        store.close()
+
+if __name__ == "__main__":
+    unittest.main()
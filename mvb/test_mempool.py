@@ -0,0 +1,151 @@
+import unittest
+from mempool import Mempool
+from prevout import DictPrevouts
+from s256 import PrivateKey
+from script import Script, p2pkh_script
+from template import TemplateBuilder
+from tx import Tx, TxIn, TxOut
+
+
+class MempoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.private_key = PrivateKey(8675309)
+        self.script_pubkey = p2pkh_script(self.private_key.point.hash160())
+        # a confirmed tx with ten 1 BTC outputs
+        self.funding = Tx(1, [TxIn(b'\x01' * 32, 0)],
+                          [TxOut(100000000, self.script_pubkey) for _ in range(10)], 0)
+        self.confirmed = DictPrevouts()
+        self.confirmed.add_tx(self.funding)
+
+    def spend(self, outpoints, fee=1000, outputs=1, sign=True):
+        '''A tx spending outpoints of (tx, index) to outputs equal outputs'''
+        total = sum(tx.tx_outs[i].amount for tx, i in outpoints) - fee
+        tx = Tx(1, [TxIn(prev.hash(), i) for prev, i in outpoints],
+                [TxOut(total // outputs, self.script_pubkey) for _ in range(outputs)], 0)
+        if sign:
+            prevouts = DictPrevouts()
+            for prev, _ in outpoints:
+                prevouts.add_tx(prev)
+            for i in range(len(tx.tx_ins)):
+                tx.sign_input(i, self.private_key, prevouts=prevouts)
+        return tx
+
+    def malformed(self, outpoints):
+        '''A spend whose script_sig has the unknown opcode 0xba'''
+        tx = self.spend(outpoints, sign=False)
+        tx.tx_ins[0].script_sig = Script([0xba])
+        return tx
+
+    def test_accept(self):
+        mempool = Mempool(self.confirmed)
+        parent = self.spend([(self.funding, 0)], outputs=2)
+        child = self.spend([(parent, 0)])
+        self.assertEqual(mempool.add(parent), parent.hash())
+        mempool.add(child)
+        self.assertEqual(len(mempool), 2)
+        self.assertIs(mempool.get(child.hash()), child)
+        self.assertEqual(mempool.spender((self.funding.hash(), 0)), parent.hash())
+        self.assertEqual(mempool.spender((parent.hash(), 0)), child.hash())
+        self.assertEqual(mempool.descendants(mempool.entries[parent.hash()]), {child.hash()})
+        self.assertEqual(mempool.ancestors(mempool.entries[child.hash()]), {parent.hash()})
+        self.assertEqual(mempool.entries[parent.hash()].descendant_fee, 2000)
+        bad = {
+            'duplicate': parent,
+            'double spend': self.spend([(self.funding, 0)], fee=2000),
+            'spent in pool': self.spend([(parent, 0)], fee=5000),
+            'missing input': self.spend([(self.spend([(self.funding, 5)], sign=False), 0)], sign=False),
+            'overspend': self.spend([(self.funding, 1)], fee=-1),
+            'bad script': self.spend([(self.funding, 1)], sign=False),
+            'malformed script': self.malformed([(self.funding, 1)]),
+        }
+        for reason, tx in bad.items():
+            with self.assertRaises(ValueError, msg=reason):
+                mempool.add(tx)
+        stats = mempool.stats()
+        self.assertEqual((stats['accepted'], stats['rejected']), (2, len(bad)))
+        self.assertGreater(stats['accept_rate'], 0)
+        # a fresh spend of a confirmed output still gets in
+        mempool.add(self.spend([(parent, 1)]))
+        self.assertEqual(len(mempool), 3)
+
+    def test_limits(self):
+        mempool = Mempool(self.confirmed, ancestor_limit=3, descendant_limit=3, verify=False)
+        chain = [self.spend([(self.funding, 0)], outputs=2, sign=False)]
+        for _ in range(2):
+            chain.append(self.spend([(chain[-1], 0)], outputs=2, sign=False))
+        for tx in chain:
+            mempool.add(tx)
+        # a 4th in the chain has 3 ancestors
+        with self.assertRaises(ValueError):
+            mempool.add(self.spend([(chain[-1], 0)], sign=False))
+        # a sibling of the 2nd would give the 1st 3 descendants
+        with self.assertRaises(ValueError):
+            mempool.add(self.spend([(chain[0], 1)], sign=False))
+        self.assertEqual(len(mempool), 3)
+
+    def test_eviction(self):
+        mempool = Mempool(self.confirmed, verify=False)
+        cheap = self.spend([(self.funding, 0)], fee=100, sign=False)
+        parent = self.spend([(self.funding, 1)], fee=100, sign=False)
+        child = self.spend([(parent, 0)], fee=100000, sign=False)
+        middle = self.spend([(self.funding, 2)], fee=10000, sign=False)
+        for tx in (cheap, parent, child, middle):
+            mempool.add(tx)
+        # room for three of them
+        mempool.max_usage = mempool.usage - 1
+        mempool.trim()
+        self.assertNotIn(cheap.hash(), mempool)
+        self.assertIn(parent.hash(), mempool)
+        self.assertEqual(mempool.stats()['evicted'], 1)
+        # too little to get in over the rest
+        with self.assertRaises(ValueError):
+            mempool.add(self.spend([(self.funding, 3)], fee=50, sign=False))
+        self.assertEqual(len(mempool), 3)
+        stats = mempool.stats()
+        self.assertEqual((stats['evicted'], stats['rejected']), (1, 1))
+        # with the child gone the parent is the cheapest
+        mempool.remove(child.hash())
+        mempool.max_usage = mempool.usage - 1
+        mempool.trim()
+        self.assertEqual(set(mempool.entries), {middle.hash()})
+        self.assertEqual(mempool.spenders, {(self.funding.hash(), 2): middle.hash()})
+
+    def test_remove_for_block(self):
+        mempool = Mempool(self.confirmed, verify=False)
+        parent = self.spend([(self.funding, 0)], sign=False)
+        child = self.spend([(parent, 0)], sign=False)
+        loser = self.spend([(self.funding, 1)], sign=False)
+        loser_child = self.spend([(loser, 0)], sign=False)
+        for tx in (parent, child, loser, loser_child):
+            mempool.add(tx)
+        # the block confirms parent and spends funding:1 differently
+        winner = self.spend([(self.funding, 1)], fee=3000, sign=False)
+        mempool.remove_for_block([parent, winner])
+        self.assertEqual(set(mempool.entries), {child.hash()})
+        self.assertEqual(mempool.entries[child.hash()].parents, set())
+        self.assertEqual(mempool.spenders, {(parent.hash(), 0): child.hash()})
+
+    def test_stale_scores(self):
+        mempool = Mempool(self.confirmed, verify=False)
+        parent = self.spend([(self.funding, 0)], outputs=2, sign=False)
+        mempool.add(parent)
+        # every child rescores the parent, and every confirmation too
+        for _ in range(200):
+            child = self.spend([(parent, 0)], sign=False)
+            mempool.add(child)
+            mempool.remove_for_block([child])
+        self.assertLessEqual(len(mempool.scores), 2 * len(mempool) + 101)
+
+    def test_candidates(self):
+        mempool = Mempool(self.confirmed, verify=False)
+        parent = self.spend([(self.funding, 0)], fee=0, sign=False)
+        child = self.spend([(parent, 0)], fee=50000, sign=False)
+        mempool.add(parent)
+        mempool.add(child)
+        txs, fees, _, _ = TemplateBuilder().select(mempool.candidates())
+        self.assertEqual(txs, [parent, child])
+        self.assertEqual(fees, 50000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+from block import Block
+from miner import Miner, search_nonces
+
+# about one hash in 4096 meets it
+TEST_BITS = bytes.fromhex('ffff0f20')
+
+
+def make_header(bits=TEST_BITS):
+    return Block(0x20000000, b'\x11' * 32, b'\x22' * 32, 1296688602, bits, bytes(4))
+
+
+class MinerTest(unittest.TestCase):
+
+    def test_search_nonces(self):
+        block = make_header()
+        prefix = block.serialize()[:76]
+        nonce, count = search_nonces((prefix, block.target(), 0, 2**20))
+        self.assertEqual(count, nonce + 1)
+        block.nonce = nonce.to_bytes(4, 'little')
+        self.assertTrue(block.check_pow())
+        # no nonce below the one found works
+        for earlier in range(nonce):
+            block.nonce = earlier.to_bytes(4, 'little')
+            self.assertFalse(block.check_pow())
+        self.assertEqual(search_nonces((prefix, 0, 5, 10)), (None, 5))
+
+    def test_mine(self):
+        miner = Miner(chunk_size=1000)
+        block = make_header()
+        mined = miner.mine(block)
+        self.assertTrue(mined.check_pow())
+        self.assertEqual(mined.prev_block, block.prev_block)
+        stats = miner.stats()
+        self.assertGreater(stats['hashes'], 0)
+        self.assertGreater(stats['hashrate'], 0)
+
+    def test_roll(self):
+        # a nonce space of 2**32 is too big to run out of in a test, so
+        # pretend each pass is over after the first chunk
+        miner = Miner(chunk_size=10)
+        rolls = []
+
+        def roll(block, n):
+            rolls.append(n)
+            return Block(block.version, block.prev_block, n.to_bytes(32, 'big'),
+                         block.timestamp, block.bits, block.nonce)
+
+        with patch('miner.NONCE_SPACE', 10):
+            mined = miner.mine(make_header(), roll=roll)
+        self.assertTrue(mined.check_pow())
+        self.assertEqual(mined.merkle_root, rolls[-1].to_bytes(32, 'big'))
+        self.assertEqual(rolls, list(range(len(rolls))))
+        self.assertEqual(miner.stats()['hashes'], 10 * (len(rolls) - 1) + mined.nonce[0] + 1)
+
+    def test_max_hashes(self):
+        miner = Miner(chunk_size=100)
+        self.assertIsNone(miner.mine(make_header(bytes.fromhex('ffff001d')), max_hashes=300))
+        self.assertEqual(miner.stats()['hashes'], 300)
+
+    def test_parallel(self):
+        miner = Miner(workers=2, chunk_size=500)
+        try:
+            mined = miner.mine(make_header())
+        finally:
+            miner.close()
+        self.assertTrue(mined.check_pow())
+
+if __name__ == "__main__":
+    unittest.main()
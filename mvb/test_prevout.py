@@ -0,0 +1,38 @@
+import unittest
+from prevout import DictPrevouts, PrevoutProvider
+from s256 import PrivateKey
+from script import p2pkh_script
+from tx import Tx, TxIn, TxOut
+
+class DictPrevoutsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.private_key = PrivateKey(8675309)
+        h160 = self.private_key.point.hash160()
+        self.prev_tx = Tx(1, [TxIn(bytes(32), 0xffffffff)],
+                          [TxOut(50000, p2pkh_script(h160)), TxOut(20000, p2pkh_script(h160))], 0)
+        self.prevouts = DictPrevouts()
+        self.prevouts.add_tx(self.prev_tx)
+
+    def test_get(self):
+        tx_out = self.prevouts.get(self.prev_tx.hash(), 1)
+        self.assertEqual(tx_out.amount, 20000)
+        with self.assertRaises(KeyError):
+            self.prevouts.get(self.prev_tx.hash(), 2)
+        # a backend has to implement get
+        with self.assertRaises(TypeError):
+            PrevoutProvider()
+
+    def test_verify(self):
+        tx_ins = [TxIn(self.prev_tx.hash(), 0), TxIn(self.prev_tx.hash(), 1)]
+        tx_outs = [TxOut(60000, p2pkh_script(bytes(20)))]
+        tx = Tx(1, tx_ins, tx_outs, 0)
+        self.assertEqual(tx.fee(prevouts=self.prevouts), 10000)
+        self.assertTrue(tx.sign_input(0, self.private_key, prevouts=self.prevouts))
+        self.assertTrue(tx.sign_input(1, self.private_key, prevouts=self.prevouts))
+        self.assertTrue(tx.verify(prevouts=self.prevouts))
+        tx.tx_outs[0].amount = 80000
+        self.assertFalse(tx.verify(prevouts=self.prevouts))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import patch
+from fixtures import REGTEST_BITS, make_txs
+from helper import hash256, merkle_branch, merkle_root, merkle_root_from_branch
+from script import p2pkh_script
+from template import BlockTemplate, TemplateBuilder
+from tx import Tx, TxIn, TxOut
+
+
+class BlockTemplateTest(unittest.TestCase):
+
+    def test_merkle_branch(self):
+        for count in range(1, 20):
+            hashes = [hash256(bytes([i])) for i in range(count)]
+            branch = merkle_branch(hashes)
+            self.assertEqual(merkle_root_from_branch(hashes[0], branch), merkle_root(list(hashes)))
+            other = hash256(b'other')
+            self.assertEqual(merkle_root_from_branch(other, branch),
+                             merkle_root([other] + hashes[1:]))
+
+    def test_merkle_root(self):
+        template = BlockTemplate(0x20000000, b'\x11' * 32, 1296688602, REGTEST_BITS, 300,
+                                 make_txs(10), 50 * 100000000, p2pkh_script(b'\x01' * 20))
+        for extranonce in (0, 1, 2**40):
+            header = template.header(extranonce)
+            block = template.block(header)
+            self.assertTrue(block.validate_merkle_root())
+            self.assertEqual(block.txs[0].coinbase_height(), 300)
+            self.assertEqual(block.txs[0].tx_ins[0].script_sig.cmds[1],
+                             extranonce.to_bytes(8, 'little'))
+        # only the latest headers are remembered
+        old = template.header(0)
+        for extranonce in range(1, 100):
+            template.header(extranonce)
+        self.assertLessEqual(len(template.extranonces), 16)
+        with self.assertRaises(ValueError):
+            template.block(old)
+        self.assertTrue(template.block(template.header(100)).validate_merkle_root())
+
+    def test_mine(self):
+        template = BlockTemplate(0x20000000, b'\x11' * 32, 1296688602, REGTEST_BITS, 1,
+                                 make_txs(3), 50 * 100000000, p2pkh_script(b'\x01' * 20))
+        # runs out of nonces every 2 tries to get the extranonce rolling
+        with patch('miner.NONCE_SPACE', 2):
+            block = template.mine()
+        self.assertTrue(block.check_pow())
+        self.assertTrue(block.validate_merkle_root())
+        self.assertEqual(len(block.txs), 4)
+        self.assertIs(block.txs[1], template.txs[0])
+
+class TemplateBuilderTest(unittest.TestCase):
+
+    def spend(self, parent, index=0, outputs=1):
+        return Tx(1, [TxIn(parent.hash(), index)],
+                  [TxOut(1000, p2pkh_script(b'\x00' * 20)) for _ in range(outputs)], 0)
+
+    def test_child_pays_for_parent(self):
+        loose = make_txs(3)
+        parent = self.spend(loose[0])
+        child = self.spend(parent)
+        middle = loose[1]
+        weight = parent.weight()
+        candidates = [(child, 50 * weight), (parent, 0), (middle, 20 * weight)]
+        # room for two of them
+        builder = TemplateBuilder(max_weight=2 * weight + 4000)
+        txs, fees, total_weight, sigops = builder.select(candidates)
+        self.assertEqual(txs, [parent, child])
+        self.assertEqual(fees, 50 * weight)
+        self.assertEqual(total_weight, 2 * weight)
+        # one OP_CHECKSIG each, at 4 per legacy sigop
+        self.assertEqual(sigops, 2 * 4)
+
+    def test_descendants_requeued(self):
+        loose = make_txs(4)
+        parent = self.spend(loose[0], outputs=2)
+        weight = parent.weight()
+        # the first child pulls the parent in, the second child alone
+        # then beats the loose tx although its package didn't
+        first = self.spend(parent, 0)
+        second = self.spend(parent, 1)
+        candidates = [(parent, 0), (first, 100 * weight), (second, 10 * weight), (loose[1], 8 * weight)]
+        txs, fees, _, _ = TemplateBuilder().select(candidates)
+        self.assertEqual(txs, [parent, first, second, loose[1]])
+        self.assertEqual(fees, 118 * weight)
+
+    def test_sigop_limit(self):
+        txs = make_txs(5)
+        # room for three after the coinbase's share, the best paying ones
+        builder = TemplateBuilder(max_sigops=400 + 3 * txs[0].sigop_count() * 4)
+        selected, _, _, sigops = builder.select([(tx, 1000 + i) for i, tx in enumerate(txs)])
+        self.assertEqual(selected, txs[:1:-1])
+        self.assertEqual(sigops, 3 * 4)
+
+    def test_nearly_full(self):
+        loose = make_txs(11)
+        weight = loose[0].weight()
+        heavy = [Tx(1, [TxIn(hash256(b'heavy' + i.to_bytes(4, 'little')), 0)],
+                    [TxOut(1000, p2pkh_script(b'\x00' * 20)) for _ in range(10)], 0)
+                 for i in range(1001)]
+        candidates = [(tx, 100 * weight) for tx in loose[:10]]
+        candidates += [(tx, 10 * tx.weight()) for tx in heavy]
+        candidates.append((loose[10], weight))
+        # after the first ten, room for two more loose ones but no heavy
+        # one, and the block is nearly full so it gives up before the last
+        builder = TemplateBuilder(max_weight=4000 + 12 * weight)
+        txs, _, total_weight, _ = builder.select(candidates)
+        self.assertEqual(set(txs), set(loose[:10]))
+        self.assertEqual(total_weight, 10 * weight)
+
+    def test_build(self):
+        loose = make_txs(20)
+        candidates = [(tx, 1000 * i) for i, tx in enumerate(loose)]
+        chain = loose[0]
+        for i in range(10):
+            chain = self.spend(chain)
+            candidates.append((chain, 500))
+        template, report = TemplateBuilder().build(
+            candidates, b'\x11' * 32, 1, REGTEST_BITS, 1296688602, p2pkh_script(b'\x01' * 20))
+        self.assertEqual(report['txs'], 30)
+        self.assertEqual(report['fees'], sum(fee for _, fee in candidates))
+        self.assertGreaterEqual(report['seconds'], 0)
+        block = template.block(template.header(5))
+        self.assertTrue(block.validate_merkle_root())
+        self.assertEqual(block.txs[0].tx_outs[0].amount, 50 * 100000000 + report['fees'])
+        position = {tx.hash(): i for i, tx in enumerate(block.txs)}
+        for tx in block.txs[1:]:
+            for tx_in in tx.tx_ins:
+                self.assertLess(position.get(tx_in.prev_tx, -1), position[tx.hash()])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from unittest.mock import patch
+from script import p2pkh_script
+from tx import LazyTx, Tx, TxFetcher, TxIn, TxOut
+
+RAW_TX = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+
+class TxTest(unittest.TestCase):
+
+    def test_parse(self):
+        tx = Tx.parse(BytesIO(RAW_TX))
+        self.assertEqual(tx.version, 1)
+        self.assertEqual(len(tx.tx_ins), 1)
+        want = bytes.fromhex('d1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81')
+        self.assertEqual(tx.tx_ins[0].prev_tx, want)
+        self.assertEqual(tx.tx_ins[0].prev_index, 0)
+        self.assertEqual(tx.tx_ins[0].sequence, 0xfffffffe)
+        self.assertEqual(len(tx.tx_outs), 2)
+        self.assertEqual(tx.tx_outs[0].amount, 32454049)
+        self.assertEqual(tx.tx_outs[1].amount, 10011545)
+        self.assertEqual(tx.locktime, 410393)
+
+    def test_serialize(self):
+        tx = Tx.parse(BytesIO(RAW_TX))
+        self.assertEqual(tx.serialize(), RAW_TX)
+
+    def test_parse_segwit(self):
+        # same tx with a segwit marker, flag and a two item witness
+        raw = RAW_TX[:4] + b'\x00\x01' + RAW_TX[4:-4] + b'\x02\x01\xaa\x02\xbb\xcc' + RAW_TX[-4:]
+        tx = Tx.parse(BytesIO(raw))
+        self.assertEqual(tx.tx_ins[0].witness, [b'\xaa', b'\xbb\xcc'])
+        self.assertEqual(tx.serialize(), RAW_TX)
+        self.assertEqual(tx.serialize_segwit(), raw)
+        self.assertEqual(tx.locktime, 410393)
+        lazy = LazyTx.parse(BytesIO(raw))
+        self.assertEqual(lazy.id(), tx.id())
+        self.assertEqual(lazy.serialize_segwit(), raw)
+        self.assertEqual(lazy.locktime, 410393)
+
+    def test_weight(self):
+        tx = Tx.parse(BytesIO(RAW_TX))
+        self.assertEqual(tx.weight(), len(RAW_TX) * 4)
+        raw = RAW_TX[:4] + b'\x00\x01' + RAW_TX[4:-4] + b'\x02\x01\xaa\x02\xbb\xcc' + RAW_TX[-4:]
+        tx = Tx.parse(BytesIO(raw))
+        # marker, flag and the 6 witness bytes count once each
+        self.assertEqual(tx.weight(), len(RAW_TX) * 4 + 8)
+        self.assertEqual(LazyTx.parse(BytesIO(raw)).weight(), tx.weight())
+        # two p2pkh outputs
+        self.assertEqual(tx.sigop_count(), 2)
+
+    def test_slots(self):
+        tx = Tx.parse(BytesIO(RAW_TX))
+        for obj in (tx, tx.tx_ins[0], tx.tx_outs[0], tx.tx_outs[0].script_pubkey):
+            self.assertFalse(hasattr(obj, '__dict__'))
+        want = bytes.fromhex('d1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81')
+        self.assertEqual(tx.tx_ins[0].outpoint(), (want, 0))
+
+    def test_is_final(self):
+        tx = Tx.parse(BytesIO(RAW_TX))
+        # locked until after height 410393
+        self.assertFalse(tx.is_final(410393, 1600000000))
+        self.assertTrue(tx.is_final(410394, 0))
+        tx.locktime = 1500000000
+        self.assertFalse(tx.is_final(410394, 1500000000))
+        self.assertTrue(tx.is_final(0, 1500000001))
+        tx.tx_ins[0].sequence = 0xffffffff
+        self.assertTrue(tx.is_final(0, 0))
+
+
+class TxServer(HTTPServer):
+    '''Stand-in for the tx server, serves /tx/<id>.hex from a dict'''
+
+    def __init__(self, txs):
+        super().__init__(('127.0.0.1', 0), TxHandler)
+        self.txs = {tx.id(): tx.serialize().hex() for tx in txs}
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class TxHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        tx_id = self.path[len('/tx/'):-len('.hex')]
+        with self.server.lock:
+            self.server.requested.append(tx_id)
+        body = self.server.txs.get(tx_id, 'not found').encode()
+        self.send_response(200 if tx_id in self.server.txs else 404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TxFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        # previous transactions paying 1000 * (i + 1) to each output
+        self.prev_txs = [
+            Tx(1, [TxIn(bytes(32), 0xffffffff)],
+               [TxOut(1000 * (i + 1), p2pkh_script(bytes(20))) for _ in range(4)], i)
+            for i in range(5)
+        ]
+        self.server = TxServer(self.prev_txs)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.patch = patch.object(TxFetcher, 'get_url', return_value=self.server.url())
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        for tx in self.prev_txs:
+            TxFetcher.cache.pop(tx.id(), None)
+
+    def test_prefetch_inputs(self):
+        tx_ins = [
+            TxIn(prev_tx.hash(), index)
+            for prev_tx in self.prev_txs for index in range(4)
+        ]
+        tx = Tx(1, tx_ins, [TxOut(1000, p2pkh_script(bytes(20)))], 0)
+        self.assertEqual(TxFetcher.prefetch_inputs([tx]), 5)
+        self.assertEqual(sorted(self.server.requested), sorted(t.id() for t in self.prev_txs))
+        # nothing left to download
+        self.assertEqual(TxFetcher.prefetch_inputs([tx]), 0)
+        self.assertEqual(tx.fee(), 4 * (1000 + 2000 + 3000 + 4000 + 5000) - 1000)
+        self.assertEqual(len(self.server.requested), 5)
+
+    def test_prefetch_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = TxFetcher.open_store(os.path.join(directory, 'tx.db'))
+            try:
+                # one batch after the downloads, not a write per tx
+                with patch.object(store, 'put', side_effect=AssertionError), \
+                        patch.object(store, 'put_many', wraps=store.put_many) as put_many:
+                    self.assertEqual(TxFetcher.prefetch([t.id() for t in self.prev_txs]), 5)
+                self.assertEqual(put_many.call_count, 1)
+                self.assertEqual(sorted(store.ids()), sorted(t.id() for t in self.prev_txs))
+            finally:
+                TxFetcher.close_store()
+
+    def test_fetch(self):
+        prev_tx = self.prev_txs[0]
+        tx = TxFetcher.fetch(prev_tx.id())
+        self.assertEqual(tx.serialize(), prev_tx.serialize())
+        TxFetcher.fetch(prev_tx.id())
+        self.assertEqual(self.server.requested, [prev_tx.id()])
+
+
+class LazyTxTest(unittest.TestCase):
+
+    def test_parse(self):
+        stream = BytesIO(RAW_TX + b'\xff')
+        tx = LazyTx.parse(stream)
+        # the stream is left right after the transaction
+        self.assertEqual(stream.read(), b'\xff')
+        eager = Tx.parse(BytesIO(RAW_TX))
+        self.assertEqual(tx.id(), eager.id())
+        self.assertEqual(tx.version, eager.version)
+        self.assertEqual(tx.locktime, eager.locktime)
+        self.assertEqual(tx.serialize(), RAW_TX)
+
+    def test_fields_without_decoding(self):
+        tx = LazyTx.parse(BytesIO(RAW_TX))
+        want = bytes.fromhex('d1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81')
+        self.assertEqual(tx.outpoints(), [(want, 0)])
+        self.assertEqual(tx.amounts(), [32454049, 10011545])
+        self.assertIsNone(tx._tx_ins)
+        self.assertIsNone(tx._tx_outs)
+
+    def test_decode_on_access(self):
+        tx = LazyTx.parse(BytesIO(RAW_TX))
+        eager = Tx.parse(BytesIO(RAW_TX))
+        self.assertEqual(tx.tx_ins[0].sequence, 0xfffffffe)
+        self.assertEqual(tx.tx_ins[0].script_sig.cmds, eager.tx_ins[0].script_sig.cmds)
+        script_pubkey = tx.tx_outs[0].script_pubkey
+        self.assertTrue(script_pubkey.is_p2pkh_script_pubkey())
+        self.assertEqual(script_pubkey.address(), eager.tx_outs[0].script_pubkey.address())
+        self.assertEqual(tx.serialize(), RAW_TX)
+
+    def test_modified(self):
+        tx = LazyTx.parse(BytesIO(RAW_TX))
+        tx.locktime = 0
+        self.assertEqual(tx.serialize(), RAW_TX[:-4] + b'\x00' * 4)
+        tx.tx_outs[1].amount = 1
+        eager = Tx.parse(BytesIO(RAW_TX))
+        eager.locktime = 0
+        eager.tx_outs[1].amount = 1
+        self.assertEqual(tx.serialize(), eager.serialize())
+
+if __name__ == "__main__":
+    unittest.main()
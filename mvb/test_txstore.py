@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from tx import LazyTx, Tx, TxFetcher
+from txstore import TxStore
+
+RAW_TX = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+TX_ID = Tx.parse(BytesIO(RAW_TX)).id()
+
+class TxStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'tx.db')
+
+    def tearDown(self):
+        TxFetcher.close_store()
+        TxFetcher.cache.pop(TX_ID, None)
+        self.dir.cleanup()
+
+    def test_put_get(self):
+        store = TxStore(self.filename)
+        self.assertIsNone(store.get(TX_ID))
+        self.assertNotIn(TX_ID, store)
+        store.put(TX_ID, RAW_TX)
+        self.assertEqual(store.get(TX_ID), RAW_TX)
+        self.assertIn(TX_ID, store)
+        store.close()
+        # reopening keeps what was written
+        store = TxStore(self.filename)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.ids(), [TX_ID])
+        self.assertEqual(store.get(TX_ID), RAW_TX)
+        store.close()
+
+    def test_fetch_from_store(self):
+        store = TxStore(self.filename)
+        store.put(TX_ID, RAW_TX)
+        store.close()
+        TxFetcher.open_store(self.filename)
+        tx = TxFetcher.fetch(TX_ID)
+        self.assertIsInstance(tx, LazyTx)
+        self.assertEqual(tx.serialize(), RAW_TX)
+
+    def test_import_cache(self):
+        filename = os.path.join(self.dir.name, 'tx.cache')
+        with open(filename, 'w') as f:
+            f.write(json.dumps({TX_ID: RAW_TX.hex()}))
+        with self.assertRaises(RuntimeError):
+            TxFetcher.import_cache(filename)
+        store = TxFetcher.open_store(self.filename)
+        TxFetcher.import_cache(filename)
+        self.assertEqual(store.get(TX_ID), RAW_TX)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from fixtures import make_block_txs
+from script import Script, p2pkh_script
+from tx import Tx, TxIn, TxOut
+from undo import BlockUndo, UndoStore, connect_block, disconnect_block, disconnect_blocks
+from utxo import CoinsCache, UtxoSet
+
+class UndoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        coinbase, spend, chained = make_block_txs()
+        self.block1 = [coinbase]
+        coinbase2 = Tx(1, [TxIn(bytes(32), 0xffffffff, Script([b'\x02']))],
+                       [TxOut(5000, p2pkh_script(b'\x04' * 20))], 0)
+        self.block2 = [coinbase2, spend, chained]
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_serialize(self):
+        view = UtxoSet()
+        connect_block(view, self.block1, 1)
+        undo = connect_block(view, self.block2, 2)
+        self.assertEqual(len(undo), 2)
+        parsed = BlockUndo.parse(BytesIO(undo.serialize()))
+        self.assertEqual(parsed.coins, undo.coins)
+
+    def test_disconnect(self):
+        view = UtxoSet()
+        connect_block(view, self.block1, 1)
+        before = dict(view.coins)
+        undo = connect_block(view, self.block2, 2)
+        self.assertNotEqual(view.coins, before)
+        disconnect_block(view, self.block2, undo)
+        self.assertEqual(view.coins, before)
+
+    def test_disconnect_many(self):
+        view = CoinsCache(UtxoSet())
+        store = UndoStore(os.path.join(self.dir.name, 'undo.db'))
+        undo1 = connect_block(view, self.block1, 1, b'\x01' * 32, store)
+        connect_block(view, self.block2, 2, b'\x02' * 32, store)
+        self.assertIn(b'\x02' * 32, store)
+        undo2 = store.get(b'\x02' * 32)
+        disconnect_blocks(view, [(self.block2, undo2), (self.block1, undo1)])
+        view.flush()
+        self.assertEqual(len(view.base), 0)
+        # the undo record would have no key to look it up or prune it by
+        with self.assertRaises(ValueError):
+            connect_block(view, self.block1, 1, undo_store=store)
+        self.assertIsNone(view.get((self.block1[0].hash(), 0)))
+        store.close()
+
+    def test_mismatch(self):
+        view = UtxoSet()
+        connect_block(view, self.block1, 1)
+        with self.assertRaises(ValueError):
+            disconnect_block(view, self.block2, BlockUndo())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from fixtures import make_block_txs
+from script import p2pkh_script
+from utxo import Coin, CoinsCache, CoinsView, SqliteUtxoSet, UtxoPrevouts, UtxoSet
+
+
+class CoinTest(unittest.TestCase):
+
+    def test_serialize(self):
+        coin = Coin(5000, p2pkh_script(b'\x01' * 20).raw_serialize(), 123, True)
+        parsed = Coin.parse(BytesIO(coin.serialize()))
+        self.assertEqual(parsed, coin)
+        self.assertTrue(parsed.tx_out().script_pubkey.is_p2pkh_script_pubkey())
+
+
+class UtxoSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def check_apply_block(self, view):
+        coinbase, spend, chained = make_block_txs()
+        spent = view.apply_block([coinbase, spend, chained], 7)
+        self.assertEqual(len(spent), 2)
+        self.assertEqual(spent[0][0], (coinbase.hash(), 0))
+        # only the last output is left, OP_RETURN outputs are never added
+        self.assertEqual(len(view), 1)
+        coin = view.get((chained.hash(), 0))
+        self.assertEqual(coin.amount, 3000)
+        self.assertEqual(coin.height, 7)
+        self.assertFalse(coin.is_coinbase)
+        self.assertIsNone(view.get((coinbase.hash(), 0)))
+        self.assertIsNone(view.get((coinbase.hash(), 1)))
+        # spending the same output twice fails and changes nothing
+        with self.assertRaises(ValueError):
+            view.apply_block([chained], 8)
+        self.assertIn((chained.hash(), 0), view)
+        prevouts = UtxoPrevouts(view)
+        self.assertEqual(prevouts.get(chained.hash(), 0).amount, 3000)
+        with self.assertRaises(KeyError):
+            prevouts.get(spend.hash(), 0)
+
+    def test_memory(self):
+        self.check_apply_block(UtxoSet())
+
+    def test_abstract(self):
+        # a backend has to implement get and batch_write
+        with self.assertRaises(TypeError):
+            CoinsView()
+
+    def test_sqlite(self):
+        filename = os.path.join(self.dir.name, 'utxo.db')
+        view = SqliteUtxoSet(filename)
+        self.check_apply_block(view)
+        view.close()
+        view = SqliteUtxoSet(filename)
+        self.assertEqual(len(view), 1)
+        view.close()
+
+
+class CountingUtxoSet(UtxoSet):
+    '''UtxoSet that remembers every batch written to it'''
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def batch_write(self, changes):
+        self.batches.append(changes)
+        super().batch_write(changes)
+
+
+class CoinsCacheTest(unittest.TestCase):
+
+    def test_write_back(self):
+        base = CountingUtxoSet()
+        cache = CoinsCache(base)
+        coinbase, spend, chained = make_block_txs()
+        cache.apply_block([coinbase], 1)
+        cache.apply_block([spend, chained], 2)
+        self.assertEqual(base.batches, [])
+        self.assertEqual(cache.get((chained.hash(), 0)).amount, 3000)
+        self.assertIsNone(cache.get((spend.hash(), 0)))
+        cache.flush()
+        # outputs created and spent in the cache window never get written
+        self.assertEqual(base.batches, [{(chained.hash(), 0): cache.get((chained.hash(), 0))}])
+        self.assertEqual(len(base), 1)
+        stats = cache.stats()
+        self.assertEqual(stats['flushes'][0][0], 1)
+
+    def test_spend_from_base(self):
+        base = CountingUtxoSet()
+        coinbase, spend, chained = make_block_txs()
+        base.apply_block([coinbase], 1)
+        cache = CoinsCache(base)
+        cache.apply_block([spend], 2)
+        self.assertEqual(cache.stats()['misses'], 1)
+        cache.flush()
+        self.assertEqual(base.batches[-1][(coinbase.hash(), 0)], None)
+        self.assertIsNone(base.get((coinbase.hash(), 0)))
+        self.assertEqual(base.get((spend.hash(), 0)).amount, 4000)
+
+    def test_budget(self):
+        base = CountingUtxoSet()
+        cache = CoinsCache(base, budget=1)
+        coinbase, spend, chained = make_block_txs()
+        cache.apply_block([coinbase], 1)
+        self.assertEqual(len(base.batches), 1)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get((coinbase.hash(), 0)).amount, 5000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+from fixtures import make_block
+from prevout import DictPrevouts
+from s256 import PrivateKey
+from script import Script, p2pkh_script
+from tx import Tx, TxIn, TxOut
+from utxo import UtxoSet
+from validation import AssumeValid, BlockValidator
+
+
+def mine(block):
+    '''Finds a nonce that satisfies the block's (easy) target'''
+    nonce = 0
+    while not block.check_pow():
+        nonce += 1
+        block.nonce = nonce.to_bytes(4, 'little')
+    return block
+
+
+def make_coinbase(height, amount, h160):
+    script_sig = Script([height.to_bytes(3, 'little')])
+    return Tx(1, [TxIn(bytes(32), 0xffffffff, script_sig)], [TxOut(amount, p2pkh_script(h160))], 0)
+
+
+class BlockValidatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.private_key = PrivateKey(8675309)
+        self.h160 = self.private_key.point.hash160()
+        self.view = UtxoSet()
+        # a mature coinbase to spend
+        self.funding = make_coinbase(1, 50 * 100000000, self.h160)
+        self.view.apply_block([self.funding], 1)
+
+    def make_spends(self, fee=1000):
+        '''A tx spending the funding coinbase and one spending that tx,
+        both signed'''
+        prevouts = DictPrevouts()
+        prevouts.add_tx(self.funding)
+        spend = Tx(1, [TxIn(self.funding.hash(), 0)],
+                   [TxOut(50 * 100000000 - fee, p2pkh_script(self.h160))], 0)
+        spend.sign_input(0, self.private_key, prevouts=prevouts)
+        prevouts.add_tx(spend)
+        chained = Tx(1, [TxIn(spend.hash(), 0)],
+                     [TxOut(50 * 100000000 - 2 * fee, p2pkh_script(self.h160))], 0)
+        chained.sign_input(0, self.private_key, prevouts=prevouts)
+        return [spend, chained]
+
+    def check_connect(self, workers):
+        spends = self.make_spends()
+        coinbase = make_coinbase(101, 50 * 100000000 + 2000, self.h160)
+        block = mine(make_block([coinbase] + spends))
+        validator = BlockValidator(self.view, workers=workers)
+        try:
+            report = validator.connect(block, 101)
+        finally:
+            validator.close()
+        self.assertEqual(report['fees'], 2000)
+        self.assertEqual(len(report['undo']), 2)
+        self.assertEqual(set(report['timings']), {'structure', 'resolve', 'scripts', 'connect'})
+        self.assertIsNone(self.view.get((self.funding.hash(), 0)))
+        self.assertEqual(self.view.get((spends[1].hash(), 0)).amount, 50 * 100000000 - 2000)
+
+    def test_connect(self):
+        self.check_connect(workers=1)
+
+    def test_connect_parallel(self):
+        self.check_connect(workers=2)
+
+    def assertInvalid(self, txs, height=101):
+        block = mine(make_block(txs))
+        before = dict(self.view.coins)
+        with self.assertRaises(ValueError):
+            BlockValidator(self.view).connect(block, height)
+        self.assertEqual(self.view.coins, before)
+
+    def test_bad_signature(self):
+        spends = self.make_spends()
+        spends[1].tx_outs[0].amount -= 1
+        self.assertInvalid([make_coinbase(101, 50 * 100000000, self.h160)] + spends)
+
+    def test_malformed_script(self):
+        spends = self.make_spends()
+        # 0xba isn't an opcode, evaluating it raises KeyError
+        spends[1].tx_ins[0].script_sig = Script([0xba])
+        block = mine(make_block([make_coinbase(101, 50 * 100000000, self.h160)] + spends))
+        with self.assertRaisesRegex(ValueError, '{} input 0: KeyError'.format(spends[1].id())):
+            BlockValidator(self.view).connect(block, 101)
+
+    def test_coinbase_too_large(self):
+        spends = self.make_spends()
+        self.assertInvalid([make_coinbase(101, 50 * 100000000 + 2001, self.h160)] + spends)
+
+    def test_immature(self):
+        spends = self.make_spends()
+        self.assertInvalid([make_coinbase(100, 50 * 100000000, self.h160)] + spends, height=100)
+
+    def test_double_spend(self):
+        spends = self.make_spends()
+        self.assertInvalid([make_coinbase(101, 50 * 100000000, self.h160)] + spends + spends[:1])
+
+    def test_locktime(self):
+        coinbase = make_coinbase(101, 50 * 100000000, self.h160)
+        coinbase.locktime = 1600000000
+        coinbase.tx_ins[0].sequence = 0xfffffffe
+        block = mine(make_block([coinbase]))
+        with self.assertRaises(ValueError):
+            BlockValidator(self.view).connect(block, 101, median_time_past=1600000000)
+        report = BlockValidator(self.view).connect(block, 101, median_time_past=1600000001)
+        self.assertEqual(report['fees'], 0)
+
+    def test_bad_merkle_root(self):
+        block = mine(make_block([make_coinbase(101, 50 * 100000000, self.h160)]))
+        block.merkle_root = bytes(32)
+        with self.assertRaises(ValueError):
+            BlockValidator(self.view).connect(block, 101)
+
+
+class AssumeValidTest(unittest.TestCase):
+
+    def test_covers(self):
+        parents = {b'\x01' * 32: b'\x00' * 32, b'\x02' * 32: b'\x01' * 32, b'\x03' * 32: b'\x02' * 32}
+        assume_valid = AssumeValid(b'\x02' * 32, parents)
+        self.assertTrue(assume_valid.covers(b'\x01' * 32))
+        self.assertTrue(assume_valid.covers(b'\x02' * 32))
+        self.assertFalse(assume_valid.covers(b'\x03' * 32))
+        self.assertTrue(assume_valid.complete)
+
+    def test_headers_arrive_later(self):
+        parents = {b'\x02' * 32: b'\x01' * 32}
+        assume_valid = AssumeValid(b'\x02' * 32, parents)
+        self.assertFalse(assume_valid.covers(b'\x01' * 32))
+        parents[b'\x01' * 32] = b'\x00' * 32
+        self.assertTrue(assume_valid.covers(b'\x01' * 32))
+        self.assertTrue(assume_valid.complete)
+
+    def test_skip_scripts(self):
+        private_key = PrivateKey(8675309)
+        h160 = private_key.point.hash160()
+        view = UtxoSet()
+        funding = make_coinbase(1, 50 * 100000000, h160)
+        view.apply_block([funding], 1)
+        # never signed, so the script check would fail
+        spend = Tx(1, [TxIn(funding.hash(), 0)], [TxOut(1000, p2pkh_script(h160))], 0)
+        block = mine(make_block([make_coinbase(101, 50 * 100000000, h160), spend]))
+        other = AssumeValid(b'\x01' * 32, {b'\x01' * 32: b'\x00' * 32})
+        with self.assertRaises(ValueError):
+            BlockValidator(view, assume_valid=other).connect(block, 101)
+        assume_valid = AssumeValid(block.hash(), {block.hash(): block.prev_block})
+        report = BlockValidator(view, assume_valid=assume_valid).connect(block, 101)
+        self.assertFalse(report['scripts_checked'])
+        self.assertEqual(view.get((spend.hash(), 0)).amount, 1000)
+
+if __name__ == "__main__":
+    unittest.main()
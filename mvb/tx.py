@@ -1,8 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 import json
 import requests
+from requests.adapters import HTTPAdapter
 
+from cache import LRUCache
+from prevout import PrevoutProvider
 from s256 import PrivateKey
 from helper import (
     encode_varint,
@@ -10,12 +14,23 @@ from helper import (
     int_to_little_endian,
     little_endian_to_int,
     read_varint,
+    LOCKTIME_THRESHOLD,
     SIGHASH_ALL,
 )
-from script import Script
+from script import LazyScript, Script
+from txstore import TxStore
 
 class TxFetcher:
-    cache = {}
+    # bounded and shared by every thread, see cache.LRUCache
+    cache = LRUCache(maxsize=100000)
+    # optional persistent TxStore, see open_store
+    store = None
+    # optional blockstore.BlockStore with a txindex, looked at first, see
+    # use_blocks
+    blocks = None
+    # pooled session and how many downloads prefetch runs at once
+    session = None
+    max_workers = 16
 
     @classmethod
     def get_url(cls, testnet=False):
@@ -24,40 +39,144 @@ class TxFetcher:
         else:
             return 'http://mainnet.programmingbitcoin.com'
 
+    @classmethod
+    def parse_raw(cls, raw, testnet=False, lazy=False):
+        '''Parses a raw transaction, segwit or not'''
+        if lazy:
+            return LazyTx.parse(BytesIO(raw), testnet=testnet)
+        return Tx.parse(BytesIO(raw), testnet=testnet)
+
+    @classmethod
+    def get_session(cls):
+        '''Returns the shared requests.Session so connections get reused'''
+        if cls.session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=2, pool_maxsize=cls.max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            cls.session = session
+        return cls.session
+
+    @classmethod
+    def download(cls, tx_id, testnet=False):
+        '''Fetches the transaction from the server and checks its id'''
+        url = '{}/tx/{}.hex'.format(cls.get_url(testnet), tx_id)
+        response = cls.get_session().get(url)
+        try:
+            raw = bytes.fromhex(response.text.strip())
+        except ValueError:
+            raise ValueError('unexpected response: {}'.format(response.text))
+        tx = cls.parse_raw(raw, testnet=testnet)
+        # make sure the tx we got matches to the hash we requested
+        if tx.id() != tx_id:
+            raise ValueError('not the same id: {} vs {}'.format(tx.id(), tx_id))
+        return tx
+
+    @classmethod
+    def load(cls, tx_id, testnet=False, downloaded=None):
+        '''Reads the transaction from the block files or the store,
+        otherwise downloads it and appends it to the store, or to the list
+        downloaded as (tx_id, raw) for the caller to store in one batch'''
+        if cls.blocks is not None:
+            raw = cls.blocks.read_tx(tx_id)
+            if raw is not None:
+                return cls.parse_raw(raw, testnet=testnet, lazy=True)
+        if cls.store is not None:
+            raw = cls.store.get(tx_id)
+            if raw is not None:
+                # only parsed now that someone asked for it
+                return cls.parse_raw(raw, testnet=testnet, lazy=True)
+        tx = cls.download(tx_id, testnet=testnet)
+        if downloaded is not None:
+            downloaded.append((tx_id, tx.serialize()))
+        elif cls.store is not None:
+            cls.store.put(tx_id, tx.serialize())
+        return tx
+
     @classmethod
     def fetch(cls, tx_id, testnet=False, fresh=False):
-        if fresh or (tx_id not in cls.cache):
-            url = '{}/tx/{}.hex'.format(cls.get_url(testnet), tx_id)
-            response = requests.get(url)
-            try:
-                raw = bytes.fromhex(response.text.strip())
-            except ValueError:
-                raise ValueError('unexpected response: {}'.format(response.text))
-            # make sure the tx we got matches to the hash we requested
-            if raw[4] == 0:
-                raw = raw[:4] + raw[6:]
-                tx = Tx.parse(BytesIO(raw), testnet=testnet)
-                tx.locktime = little_endian_to_int(raw[-4:])
-            else:
-                tx = Tx.parse(BytesIO(raw), testnet=testnet)
-            if tx.id() != tx_id:
-                raise ValueError('not the same id: {} vs {}'.format(tx.id(), tx_id))
+        if fresh:
+            tx = cls.download(tx_id, testnet=testnet)
             cls.cache[tx_id] = tx
-        cls.cache[tx_id].testnet = testnet
-        return cls.cache[tx_id]
+            if cls.store is not None:
+                cls.store.put(tx_id, tx.serialize())
+        else:
+            # threads asking for the same tx id share one load
+            tx = cls.cache.get_or_load(tx_id, lambda: cls.load(tx_id, testnet=testnet))
+        tx.testnet = testnet
+        return tx
+
+    @classmethod
+    def prefetch(cls, tx_ids, testnet=False):
+        '''Loads every tx id that's not cached yet, at most max_workers at
+        a time, and stores the downloaded ones in a single transaction.
+        Returns how many were loaded'''
+        missing = [tx_id for tx_id in set(tx_ids) if tx_id not in cls.cache]
+        if not missing:
+            return 0
+        downloaded = []
+
+        def load(tx_id):
+            # single flight with fetch, but the store write is batched
+            cls.cache.get_or_load(
+                tx_id, lambda: cls.load(tx_id, testnet=testnet, downloaded=downloaded))
+
+        with ThreadPoolExecutor(max_workers=cls.max_workers) as executor:
+            list(executor.map(load, missing))
+        if downloaded and cls.store is not None:
+            cls.store.put_many(downloaded)
+        return len(missing)
+
+    @classmethod
+    def prefetch_inputs(cls, txs, testnet=False):
+        '''Prefetches the previous transactions of every input of txs,
+        skipping coinbases and transactions that are part of txs'''
+        txs = list(txs)
+        own = set(tx.id() for tx in txs)
+        tx_ids = []
+        for tx in txs:
+            if tx.is_coinbase():
+                continue
+            for tx_in in tx.tx_ins:
+                tx_id = tx_in.prev_tx.hex()
+                if tx_id not in own:
+                    tx_ids.append(tx_id)
+        return cls.prefetch(tx_ids, testnet=testnet)
+
+    @classmethod
+    def open_store(cls, filename):
+        '''Uses the TxStore at filename as a persistent cache. Transactions
+        are read from it on lookup and every fetched one is appended'''
+        cls.store = TxStore(filename)
+        return cls.store
+
+    @classmethod
+    def close_store(cls):
+        if cls.store is not None:
+            cls.store.close()
+            cls.store = None
+
+    @classmethod
+    def use_blocks(cls, block_store):
+        '''Reads transactions out of the block files of block_store, a
+        blockstore.BlockStore with a txindex, before the store or the
+        server'''
+        if block_store.txindex is None:
+            raise ValueError('the BlockStore has no txindex')
+        cls.blocks = block_store
+        return block_store
+
+    @classmethod
+    def detach_blocks(cls):
+        '''Stops reading from the block files, the BlockStore stays open'''
+        cls.blocks = None
 
     @classmethod
     def load_cache(cls, filename):
         disk_cache = json.loads(open(filename, 'r').read())
         for k, raw_hex in disk_cache.items():
-            raw = bytes.fromhex(raw_hex)
-            if raw[4] == 0:
-                raw = raw[:4] + raw[6:]
-                tx = Tx.parse(BytesIO(raw))
-                tx.locktime = little_endian_to_int(raw[-4:])
-            else:
-                tx = Tx.parse(BytesIO(raw))
-            cls.cache[k] = tx
+            cls.cache[k] = cls.parse_raw(bytes.fromhex(raw_hex))
 
     @classmethod
     def dump_cache(cls, filename):
@@ -66,9 +185,52 @@ class TxFetcher:
             s = json.dumps(to_dump, sort_keys=True, indent=4)
             f.write(s)
 
+    @classmethod
+    def import_cache(cls, filename):
+        '''Moves a JSON cache written by dump_cache into the open store'''
+        if cls.store is None:
+            raise RuntimeError('no store is open, call TxFetcher.open_store first')
+        disk_cache = json.loads(open(filename, 'r').read())
+        cls.store.put_many(
+            (k, cls.parse_raw(bytes.fromhex(raw_hex)).serialize())
+            for k, raw_hex in disk_cache.items()
+        )
+
+
+def read_segwit_flag(s):
+    '''Reads the flag that follows the segwit marker'''
+    flag = s.read(1)
+    if flag != b'\x01':
+        raise SyntaxError('bad segwit flag: {}'.format(flag.hex()))
+
+
+def read_witness(s):
+    '''Reads the witness of one input, returns the list of items'''
+    num_items = read_varint(s)
+    return [s.read(read_varint(s)) for _ in range(num_items)]
+
+
+class FetcherPrevouts(PrevoutProvider):
+    '''Backend that reads outputs from the transactions TxFetcher fetches'''
+
+    def get(self, prev_tx, prev_index, testnet=False):
+        tx = TxFetcher.fetch(prev_tx.hex(), testnet=testnet)
+        try:
+            return tx.tx_outs[prev_index]
+        except IndexError:
+            raise KeyError((prev_tx, prev_index))
+
+    def prefetch(self, txs, testnet=False):
+        TxFetcher.prefetch_inputs(txs, testnet=testnet)
+
+
+# used when no PrevoutProvider is passed in
+FETCHER_PREVOUTS = FetcherPrevouts()
+
 
 class Tx:
     command = b'tx'
+    __slots__ = ('version', 'tx_ins', 'tx_outs', 'locktime', 'testnet')
 
     def __init__(self, version, tx_ins, tx_outs, locktime, testnet=False):
         self.version = version
@@ -110,6 +272,11 @@ class Tx:
         version = little_endian_to_int(s.read(4))
         # num_inputs is a varint
         num_inputs = read_varint(s)
+        # zero inputs is the segwit marker, followed by the flag
+        segwit = num_inputs == 0
+        if segwit:
+            read_segwit_flag(s)
+            num_inputs = read_varint(s)
         # parse num_inputs number of TxIns
         inputs = []
         for _ in range(num_inputs):
@@ -120,13 +287,18 @@ class Tx:
         outputs = []
         for _ in range(num_outputs):
             outputs.append(TxOut.parse(s))
+        # each input has a witness, a list of items
+        if segwit:
+            for tx_in in inputs:
+                tx_in.witness = read_witness(s)
         # locktime is an integer in 4 bytes, little-endian
         locktime = little_endian_to_int(s.read(4))
         # return an instance of the class (see __init__ for args)
         return cls(version, inputs, outputs, locktime, testnet=testnet)
 
     def serialize(self):
-        '''Returns the byte serialization of the transaction'''
+        '''Returns the byte serialization of the transaction, without
+        witness data so it hashes to the tx id'''
         # serialize version (4 bytes, little endian)
         result = int_to_little_endian(self.version, 4)
         # encode_varint on the number of inputs
@@ -145,20 +317,74 @@ class Tx:
         result += int_to_little_endian(self.locktime, 4)
         return result
 
-    def fee(self):
+    def serialize_segwit(self):
+        '''Returns the BIP144 serialization with the marker, flag and
+        witnesses, or the legacy one if no input has a witness'''
+        if not any(tx_in.witness for tx_in in self.tx_ins):
+            return self.serialize()
+        legacy = self.serialize()
+        # the in and outputs are the same, witnesses go before locktime
+        result = legacy[:4] + b'\x00\x01' + legacy[4:-4]
+        for tx_in in self.tx_ins:
+            items = tx_in.witness or []
+            result += encode_varint(len(items))
+            for item in items:
+                result += encode_varint(len(item)) + item
+        return result + legacy[-4:]
+
+    def weight(self):
+        '''Returns the BIP141 weight: 4 per byte of the serialization
+        without witnesses and 1 per byte of witness data'''
+        return len(self.serialize()) * 4 + self.witness_size()
+
+    def witness_size(self):
+        '''Returns how many bytes the witnesses add to the serialization'''
+        if not any(tx_in.witness for tx_in in self.tx_ins):
+            return 0
+        # marker and flag
+        size = 2
+        for tx_in in self.tx_ins:
+            items = tx_in.witness or []
+            size += len(encode_varint(len(items)))
+            for item in items:
+                size += len(encode_varint(len(item))) + len(item)
+        return size
+
+    def sigop_count(self):
+        '''Returns the legacy signature operation count of the input and
+        output scripts, the way blocks are limited by it. Sigops in p2sh
+        redeem scripts and witnesses aren't counted'''
+        count = 0
+        scripts = [tx_in.script_sig for tx_in in self.tx_ins]
+        scripts += [tx_out.script_pubkey for tx_out in self.tx_outs]
+        for script in scripts:
+            for cmd in script.cmds:
+                # OP_CHECKSIG and OP_CHECKSIGVERIFY
+                if cmd in (0xac, 0xad):
+                    count += 1
+                # OP_CHECKMULTISIG and OP_CHECKMULTISIGVERIFY
+                elif cmd in (0xae, 0xaf):
+                    count += 20
+        return count
+
+    def fee(self, prevouts=None):
         '''Returns the fee of this transaction in satoshi'''
+        if prevouts is None:
+            prevouts = FETCHER_PREVOUTS
+        # look up every previous output in one go
+        prevouts.prefetch([self], testnet=self.testnet)
         # initialize input sum and output sum
         input_sum, output_sum = 0, 0
         # use TxIn.value() to sum up the input amounts
         for tx_in in self.tx_ins:
-            input_sum += tx_in.value(self.testnet)
+            input_sum += tx_in.value(self.testnet, prevouts=prevouts)
         # use TxOut.amount to sum up the output amounts
         for tx_out in self.tx_outs:
             output_sum += tx_out.amount
         # fee is input sum - output sum
         return input_sum - output_sum
 
-    def sig_hash(self, input_index, redeem_script=None):
+    def sig_hash(self, input_index, redeem_script=None, prevouts=None):
         '''Returns the integer representation of the hash that needs to get
         signed for index input_index'''
         # start the serialization with version
@@ -175,7 +401,7 @@ class Tx:
                     script_sig = redeem_script
                 # otherwise the previous tx's ScriptPubkey is the ScriptSig
                 else:
-                    script_sig = tx_in.script_pubkey(self.testnet)
+                    script_sig = tx_in.script_pubkey(self.testnet, prevouts=prevouts)
             # Otherwise, the ScriptSig is empty
             else:
                 script_sig = None
@@ -200,12 +426,12 @@ class Tx:
         # convert the result to an integer using int.from_bytes(x, 'big')
         return int.from_bytes(h256, 'big')
 
-    def verify_input(self, input_index):
+    def verify_input(self, input_index, prevouts=None):
         '''Returns whether the input has a valid signature'''
         # get the relevant input
         tx_in = self.tx_ins[input_index]
         # grab the previous ScriptPubKey
-        script_pubkey = tx_in.script_pubkey(testnet=self.testnet)
+        script_pubkey = tx_in.script_pubkey(testnet=self.testnet, prevouts=prevouts)
         # check to see if the ScriptPubkey is a p2sh using
         # Script.is_p2sh_script_pubkey()
         if script_pubkey.is_p2sh_script_pubkey():
@@ -220,27 +446,27 @@ class Tx:
             redeem_script = None
         # get the signature hash (z)
         # pass the RedeemScript to the sig_hash method
-        z = self.sig_hash(input_index, redeem_script)
+        z = self.sig_hash(input_index, redeem_script, prevouts=prevouts)
         # combine the current ScriptSig and the previous ScriptPubKey
         combined = tx_in.script_sig + script_pubkey
         # evaluate the combined script
         return combined.evaluate(z)
 
-    def verify(self):
+    def verify(self, prevouts=None):
         '''Verify this transaction'''
         # check that we're not creating money
-        if self.fee() < 0:
+        if self.fee(prevouts=prevouts) < 0:
             return False
         # check that each input has a valid ScriptSig
         for i in range(len(self.tx_ins)):
-            if not self.verify_input(i):
+            if not self.verify_input(i, prevouts=prevouts):
                 return False
         return True
 
-    def sign_input(self, input_index, private_key):
+    def sign_input(self, input_index, private_key, prevouts=None):
         '''Signs the input using the private key'''
         # get the signature hash (z)
-        z = self.sig_hash(input_index)
+        z = self.sig_hash(input_index, prevouts=prevouts)
         # get der signature of z from private key
         der = private_key.sign(z).der()
         # append the SIGHASH_ALL to der (use SIGHASH_ALL.to_bytes(1, 'big'))
@@ -252,7 +478,7 @@ class Tx:
         # change input's script_sig to new script
         self.tx_ins[input_index].script_sig = script_sig
         # return whether sig is valid using self.verify_input
-        return self.verify_input(input_index)
+        return self.verify_input(input_index, prevouts=prevouts)
 
     def is_coinbase(self):
         '''Returns whether this transaction is a coinbase transaction or not'''
@@ -269,6 +495,20 @@ class Tx:
             return False
         return True
 
+    def is_final(self, height, median_time_past):
+        '''Returns whether the locktime lets this transaction into a block
+        at height whose parent has median_time_past'''
+        if self.locktime == 0:
+            return True
+        if self.locktime < LOCKTIME_THRESHOLD:
+            cutoff = height
+        else:
+            cutoff = median_time_past
+        if self.locktime < cutoff:
+            return True
+        # the locktime is ignored when every input has the final sequence
+        return all(tx_in.sequence == 0xffffffff for tx_in in self.tx_ins)
+
     def coinbase_height(self):
         '''Returns the height of the block this coinbase transaction is in
         Returns None if this transaction is not a coinbase transaction
@@ -283,6 +523,7 @@ class Tx:
 
 
 class TxIn:
+    __slots__ = ('prev_tx', 'prev_index', 'script_sig', 'sequence', 'witness')
 
     def __init__(self, prev_tx, prev_index, script_sig=None, sequence=0xffffffff):
         self.prev_tx = prev_tx
@@ -292,6 +533,8 @@ class TxIn:
         else:
             self.script_sig = script_sig
         self.sequence = sequence
+        # list of witness items for segwit inputs
+        self.witness = None
 
     def __repr__(self):
         return '{}:{}'.format(
@@ -315,6 +558,15 @@ class TxIn:
         # return an instance of the class (see __init__ for args)
         return cls(prev_tx, prev_index, script_sig, sequence)
 
+    @classmethod
+    def parse_lazy(cls, s):
+        '''Same as parse but the ScriptSig is decoded on first access'''
+        prev_tx = s.read(32)[::-1]
+        prev_index = little_endian_to_int(s.read(4))
+        script_sig = LazyScript.parse(s)
+        sequence = little_endian_to_int(s.read(4))
+        return cls(prev_tx, prev_index, script_sig, sequence)
+
     def serialize(self):
         '''Returns the byte serialization of the transaction input'''
         # serialize prev_tx, little endian
@@ -327,31 +579,36 @@ class TxIn:
         result += int_to_little_endian(self.sequence, 4)
         return result
 
+    def outpoint(self):
+        '''Returns the (prev_tx, prev_index) tuple this input spends'''
+        return (self.prev_tx, self.prev_index)
+
     def fetch_tx(self, testnet=False):
         return TxFetcher.fetch(self.prev_tx.hex(), testnet=testnet)
 
-    def value(self, testnet=False):
-        '''Get the outpoint value by looking up the tx hash
+    def prevout(self, testnet=False, prevouts=None):
+        '''Get the TxOut this input spends from the PrevoutProvider,
+        TxFetcher by default
+        '''
+        if prevouts is None:
+            prevouts = FETCHER_PREVOUTS
+        return prevouts.get(self.prev_tx, self.prev_index, testnet=testnet)
+
+    def value(self, testnet=False, prevouts=None):
+        '''Get the outpoint value by looking up the previous output
         Returns the amount in satoshi
         '''
-        # use self.fetch_tx to get the transaction
-        tx = self.fetch_tx(testnet=testnet)
-        # get the output at self.prev_index
-        # return the amount property
-        return tx.tx_outs[self.prev_index].amount
-
-    def script_pubkey(self, testnet=False):
-        '''Get the ScriptPubKey by looking up the tx hash
+        return self.prevout(testnet=testnet, prevouts=prevouts).amount
+
+    def script_pubkey(self, testnet=False, prevouts=None):
+        '''Get the ScriptPubKey by looking up the previous output
         Returns a Script object
         '''
-        # use self.fetch_tx to get the transaction
-        tx = self.fetch_tx(testnet=testnet)
-        # get the output at self.prev_index
-        # return the script_pubkey property
-        return tx.tx_outs[self.prev_index].script_pubkey
+        return self.prevout(testnet=testnet, prevouts=prevouts).script_pubkey
 
 
 class TxOut:
+    __slots__ = ('amount', 'script_pubkey')
 
     def __init__(self, amount, script_pubkey):
         self.amount = amount
@@ -372,10 +629,158 @@ class TxOut:
         # return an instance of the class (see __init__ for args)
         return cls(amount, script_pubkey)
 
+    @classmethod
+    def parse_lazy(cls, s):
+        '''Same as parse but the ScriptPubKey is decoded on first access'''
+        amount = little_endian_to_int(s.read(8))
+        script_pubkey = LazyScript.parse(s)
+        return cls(amount, script_pubkey)
+
     def serialize(self):
         '''Returns the byte serialization of the transaction output'''
         # serialize amount, 8 bytes, little endian
         result = int_to_little_endian(self.amount, 8)
         # serialize the script_pubkey
         result += self.script_pubkey.serialize()
-        return result
\ No newline at end of file
+        return result
+
+
+class LazyTx(Tx):
+    '''Tx view over the raw serialization. parse() only scans the field
+    boundaries once, inputs, outputs and their scripts are decoded the
+    first time they're accessed. The witnesses of a segwit tx are kept
+    serialized in witness_raw, so serialize_segwit gives back what was
+    parsed'''
+    __slots__ = ('raw', 'in_offsets', 'out_offsets', 'witness_raw', '_tx_ins', '_tx_outs')
+
+    def __init__(self, raw, in_offsets, out_offsets, testnet=False, witness_raw=None):
+        self.raw = raw
+        # offsets of each input/output plus the end of the last one
+        self.in_offsets = in_offsets
+        self.out_offsets = out_offsets
+        self.version = little_endian_to_int(raw[:4])
+        self.locktime = little_endian_to_int(raw[-4:])
+        self.testnet = testnet
+        # the witnesses of every input as serialized, None if not segwit
+        self.witness_raw = witness_raw
+        self._tx_ins = None
+        self._tx_outs = None
+
+    @classmethod
+    def parse(cls, s, testnet=False):
+        '''Takes a byte stream and scans the transaction at the start
+        return a LazyTx object
+        '''
+        # version is 4 bytes
+        raw = bytearray(s.read(4))
+        # record where each input starts
+        num_inputs = read_varint(s)
+        segwit = num_inputs == 0
+        if segwit:
+            read_segwit_flag(s)
+            num_inputs = read_varint(s)
+        raw += encode_varint(num_inputs)
+        in_offsets = []
+        for _ in range(num_inputs):
+            in_offsets.append(len(raw))
+            # prev_tx and prev_index are 36 bytes
+            raw += s.read(36)
+            # skip over the ScriptSig and the 4 byte sequence
+            length = read_varint(s)
+            raw += encode_varint(length)
+            raw += s.read(length + 4)
+        in_offsets.append(len(raw))
+        # record where each output starts
+        num_outputs = read_varint(s)
+        raw += encode_varint(num_outputs)
+        out_offsets = []
+        for _ in range(num_outputs):
+            out_offsets.append(len(raw))
+            # amount is 8 bytes
+            raw += s.read(8)
+            # skip over the ScriptPubKey
+            length = read_varint(s)
+            raw += encode_varint(length)
+            raw += s.read(length)
+        out_offsets.append(len(raw))
+        # witnesses aren't part of the view, they're copied as they are
+        witness_raw = None
+        if segwit:
+            witness_raw = bytearray()
+            for _ in range(num_inputs):
+                num_items = read_varint(s)
+                witness_raw += encode_varint(num_items)
+                for _ in range(num_items):
+                    length = read_varint(s)
+                    witness_raw += encode_varint(length)
+                    witness_raw += s.read(length)
+            witness_raw = bytes(witness_raw)
+        # locktime is 4 bytes
+        raw += s.read(4)
+        return cls(bytes(raw), in_offsets, out_offsets, testnet=testnet,
+                   witness_raw=witness_raw)
+
+    @property
+    def tx_ins(self):
+        if self._tx_ins is None:
+            self._tx_ins = [
+                TxIn.parse_lazy(BytesIO(self.raw[start:end]))
+                for start, end in zip(self.in_offsets, self.in_offsets[1:])
+            ]
+        return self._tx_ins
+
+    @tx_ins.setter
+    def tx_ins(self, tx_ins):
+        self._tx_ins = tx_ins
+
+    @property
+    def tx_outs(self):
+        if self._tx_outs is None:
+            self._tx_outs = [
+                TxOut.parse_lazy(BytesIO(self.raw[start:end]))
+                for start, end in zip(self.out_offsets, self.out_offsets[1:])
+            ]
+        return self._tx_outs
+
+    @tx_outs.setter
+    def tx_outs(self, tx_outs):
+        self._tx_outs = tx_outs
+
+    def outpoints(self):
+        '''Returns the (prev_tx, prev_index) of every input without decoding
+        the inputs'''
+        if self._tx_ins is not None:
+            return [(tx_in.prev_tx, tx_in.prev_index) for tx_in in self._tx_ins]
+        raw = self.raw
+        return [
+            (raw[i:i + 32][::-1], little_endian_to_int(raw[i + 32:i + 36]))
+            for i in self.in_offsets[:-1]
+        ]
+
+    def amounts(self):
+        '''Returns the amount of every output without decoding the outputs'''
+        if self._tx_outs is not None:
+            return [tx_out.amount for tx_out in self._tx_outs]
+        raw = self.raw
+        return [little_endian_to_int(raw[i:i + 8]) for i in self.out_offsets[:-1]]
+
+    def serialize(self):
+        '''Returns the byte serialization of the transaction'''
+        # nothing decoded means nothing changed apart from version/locktime
+        if self._tx_ins is None and self._tx_outs is None:
+            return int_to_little_endian(self.version, 4) \
+                + self.raw[4:self.out_offsets[-1]] \
+                + int_to_little_endian(self.locktime, 4)
+        return super().serialize()
+
+    def serialize_segwit(self):
+        if self.witness_raw is None:
+            return self.serialize()
+        legacy = self.serialize()
+        return legacy[:4] + b'\x00\x01' + legacy[4:-4] + self.witness_raw + legacy[-4:]
+
+    def witness_size(self):
+        if self.witness_raw is None:
+            return 0
+        # marker and flag
+        return 2 + len(self.witness_raw)
@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+
+
+class TxStore:
+    '''Persistent store of raw transactions keyed by tx id, backed by sqlite.
+    Every write is committed right away so a crash loses at most the write
+    that was in flight, and nothing is parsed until it's looked up.'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        # write-ahead logging keeps readers going while we append
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS tx '
+            '(id BLOB PRIMARY KEY, raw BLOB NOT NULL) WITHOUT ROWID')
+        self.db.commit()
+
+    def __contains__(self, tx_id):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT 1 FROM tx WHERE id = ?', (bytes.fromhex(tx_id),)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM tx').fetchone()[0]
+
+    def get(self, tx_id):
+        '''Returns the raw transaction for the hex tx_id or None'''
+        with self.lock:
+            row = self.db.execute(
+                'SELECT raw FROM tx WHERE id = ?', (bytes.fromhex(tx_id),)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def put(self, tx_id, raw):
+        '''Stores the raw transaction under the hex tx_id'''
+        self.put_many([(tx_id, raw)])
+
+    def put_many(self, items):
+        '''Stores (tx_id, raw) pairs in a single transaction'''
+        rows = [(bytes.fromhex(tx_id), raw) for tx_id, raw in items]
+        with self.lock:
+            self.db.executemany('INSERT OR REPLACE INTO tx VALUES (?, ?)', rows)
+            self.db.commit()
+
+    def ids(self):
+        '''Returns the hex ids of every stored transaction'''
+        with self.lock:
+            rows = self.db.execute('SELECT id FROM tx').fetchall()
+        return [row[0].hex() for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
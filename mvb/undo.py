@@ -0,0 +1,129 @@
+import sqlite3
+import threading
+from io import BytesIO
+
+from helper import (
+    encode_varint,
+    read_varint,
+)
+from utxo import Coin
+
+
+class BlockUndo:
+    '''The coins a block spent, in the order its inputs spend them'''
+    __slots__ = ('coins',)
+
+    def __init__(self, coins=None):
+        if coins is None:
+            self.coins = []
+        else:
+            self.coins = coins
+
+    def __len__(self):
+        return len(self.coins)
+
+    @classmethod
+    def parse(cls, s):
+        '''Takes a byte stream and parses the undo record'''
+        num_coins = read_varint(s)
+        return cls([Coin.parse(s) for _ in range(num_coins)])
+
+    def serialize(self):
+        '''Returns the byte serialization of the undo record'''
+        result = encode_varint(len(self.coins))
+        for coin in self.coins:
+            result += coin.serialize()
+        return result
+
+
+class UndoStore:
+    '''Undo records keyed by block hash, backed by sqlite'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS undo '
+            '(hash BLOB PRIMARY KEY, height INTEGER NOT NULL, data BLOB NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS undo_height ON undo (height)')
+        self.db.commit()
+
+    def __contains__(self, block_hash):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT 1 FROM undo WHERE hash = ?', (block_hash,)).fetchone()
+        return row is not None
+
+    def put(self, block_hash, height, undo):
+        with self.lock:
+            with self.db:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO undo VALUES (?, ?, ?)',
+                    (block_hash, height, undo.serialize()))
+
+    def get(self, block_hash):
+        '''Returns the BlockUndo for block_hash or None'''
+        with self.lock:
+            row = self.db.execute(
+                'SELECT data FROM undo WHERE hash = ?', (block_hash,)).fetchone()
+        if row is None:
+            return None
+        return BlockUndo.parse(BytesIO(row[0]))
+
+    def delete(self, block_hash):
+        with self.lock:
+            with self.db:
+                self.db.execute('DELETE FROM undo WHERE hash = ?', (block_hash,))
+
+    def prune(self, min_height):
+        '''Deletes the undo data of every block below min_height'''
+        with self.lock:
+            with self.db:
+                self.db.execute('DELETE FROM undo WHERE height < ?', (min_height,))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def connect_block(view, txs, height, block_hash=None, undo_store=None):
+    '''Applies txs to the CoinsView and returns the BlockUndo, which is
+    also written to undo_store under block_hash when one is given'''
+    if undo_store is not None and block_hash is None:
+        raise ValueError('undo data is stored by block hash, block_hash is missing')
+    spent = view.apply_block(txs, height)
+    undo = BlockUndo([coin for _, coin in spent])
+    if undo_store is not None:
+        undo_store.put(block_hash, height, undo)
+    return undo
+
+
+def disconnect_blocks(view, blocks):
+    '''Rolls back [(txs, BlockUndo)] ordered from the tip down with a
+    single batch_write on the CoinsView'''
+    changes = {}
+    for txs, undo in blocks:
+        coins = undo.coins
+        index = len(coins)
+        # walk backwards so outputs spent inside the block end up removed
+        for tx in reversed(txs):
+            tx_hash = tx.hash()
+            for i in range(len(tx.tx_outs)):
+                changes[(tx_hash, i)] = None
+            if tx.is_coinbase():
+                continue
+            for tx_in in reversed(tx.tx_ins):
+                index -= 1
+                if index < 0:
+                    raise ValueError('undo data does not match the block')
+                changes[(tx_in.prev_tx, tx_in.prev_index)] = coins[index]
+        if index != 0:
+            raise ValueError('undo data does not match the block')
+    view.batch_write(changes)
+
+
+def disconnect_block(view, txs, undo):
+    '''Rolls back a single block, see disconnect_blocks'''
+    disconnect_blocks(view, [(txs, undo)])
@@ -0,0 +1,309 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+from compressor import (
+    compress_amount,
+    compress_script,
+    decompress_amount,
+    encode_compact_int,
+    read_compact_int,
+    read_compressed_script,
+)
+from helper import (
+    int_to_little_endian,
+    little_endian_to_int,
+)
+from prevout import PrevoutProvider
+from script import LazyScript
+from tx import TxOut
+
+
+def outpoint_key(outpoint):
+    '''Turns (prev_tx, prev_index) into the 36 byte key used on disk'''
+    prev_tx, prev_index = outpoint
+    return prev_tx + int_to_little_endian(prev_index, 4)
+
+
+def key_outpoint(key):
+    '''Inverse of outpoint_key'''
+    return (bytes(key[:32]), little_endian_to_int(key[32:]))
+
+
+class Coin:
+    '''An unspent output: amount, raw ScriptPubKey, the height of the block
+    that created it and whether it came from a coinbase'''
+    __slots__ = ('amount', 'script_pubkey', 'height', 'is_coinbase')
+
+    def __init__(self, amount, script_pubkey, height, is_coinbase=False):
+        self.amount = amount
+        self.script_pubkey = script_pubkey
+        self.height = height
+        self.is_coinbase = is_coinbase
+
+    def __repr__(self):
+        return 'Coin({}, {}, height={}, coinbase={})'.format(
+            self.amount, self.script_pubkey.hex(), self.height, self.is_coinbase)
+
+    def __eq__(self, other):
+        return self.amount == other.amount and self.script_pubkey == other.script_pubkey \
+            and self.height == other.height and self.is_coinbase == other.is_coinbase
+
+    @classmethod
+    def from_tx_out(cls, tx_out, height, is_coinbase=False):
+        return cls(tx_out.amount, tx_out.script_pubkey.raw_serialize(), height, is_coinbase)
+
+    def tx_out(self):
+        '''Returns the TxOut, the script is decoded on first access'''
+        return TxOut(self.amount, LazyScript(self.script_pubkey))
+
+    @classmethod
+    def parse(cls, s):
+        '''Takes a byte stream and parses a coin'''
+        # height and the coinbase flag share a compact int
+        code = read_compact_int(s)
+        amount = decompress_amount(read_compact_int(s))
+        script_pubkey = read_compressed_script(s)
+        return cls(amount, script_pubkey, code >> 1, bool(code & 1))
+
+    def serialize(self):
+        '''Returns the compressed serialization of the coin'''
+        result = encode_compact_int(self.height * 2 + int(self.is_coinbase))
+        result += encode_compact_int(compress_amount(self.amount))
+        result += compress_script(self.script_pubkey)
+        return result
+
+
+class CoinsView(ABC):
+    '''Base for the unspent output set. Backends implement get() and
+    batch_write(), everything else is built on those two.'''
+
+    @abstractmethod
+    def get(self, outpoint):
+        '''Returns the Coin at outpoint or None'''
+
+    @abstractmethod
+    def batch_write(self, changes):
+        '''Applies {outpoint: Coin or None} in one go, None means spent'''
+
+    def __contains__(self, outpoint):
+        return self.get(outpoint) is not None
+
+    def apply_block(self, txs, height):
+        '''Spends the inputs and adds the outputs of txs, in block order,
+        in a single batch. Outputs created and spent inside the block never
+        reach the backend. Returns the [(outpoint, Coin)] that got spent,
+        raises ValueError without changing anything if an input is missing
+        '''
+        changes = {}
+        spent = []
+        for tx in txs:
+            is_coinbase = tx.is_coinbase()
+            if not is_coinbase:
+                for tx_in in tx.tx_ins:
+                    outpoint = (tx_in.prev_tx, tx_in.prev_index)
+                    if outpoint in changes:
+                        # created earlier in this block, or already spent by it
+                        coin = changes.pop(outpoint)
+                        from_view = False
+                    else:
+                        coin = self.get(outpoint)
+                        from_view = True
+                    if coin is None:
+                        raise ValueError('missing or spent input {}:{}'.format(
+                            tx_in.prev_tx.hex(), tx_in.prev_index))
+                    spent.append((outpoint, coin))
+                    if from_view:
+                        changes[outpoint] = None
+            tx_hash = tx.hash()
+            for i, tx_out in enumerate(tx.tx_outs):
+                coin = Coin.from_tx_out(tx_out, height, is_coinbase)
+                # OP_RETURN outputs can never be spent
+                if coin.script_pubkey[:1] == b'\x6a':
+                    continue
+                changes[(tx_hash, i)] = coin
+        self.batch_write(changes)
+        return spent
+
+
+class UtxoSet(CoinsView):
+    '''In-memory unspent output set, coins are kept serialized'''
+
+    def __init__(self):
+        self.coins = {}
+
+    def __len__(self):
+        return len(self.coins)
+
+    def get(self, outpoint):
+        raw = self.coins.get(outpoint)
+        if raw is None:
+            return None
+        return Coin.parse(BytesIO(raw))
+
+    def batch_write(self, changes):
+        for outpoint, coin in changes.items():
+            if coin is None:
+                self.coins.pop(outpoint, None)
+            else:
+                self.coins[outpoint] = coin.serialize()
+
+
+class SqliteUtxoSet(CoinsView):
+    '''On-disk unspent output set keyed by the 36 byte outpoint'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS utxo '
+            '(outpoint BLOB PRIMARY KEY, coin BLOB NOT NULL) WITHOUT ROWID')
+        self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM utxo').fetchone()[0]
+
+    def get(self, outpoint):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT coin FROM utxo WHERE outpoint = ?', (outpoint_key(outpoint),)).fetchone()
+        if row is None:
+            return None
+        return Coin.parse(BytesIO(row[0]))
+
+    def batch_write(self, changes):
+        # sorted keys keep the b-tree writes sequential
+        rows = sorted((outpoint_key(outpoint), coin) for outpoint, coin in changes.items())
+        deletes = [(key,) for key, coin in rows if coin is None]
+        inserts = [(key, coin.serialize()) for key, coin in rows if coin is not None]
+        with self.lock:
+            with self.db:
+                self.db.executemany('DELETE FROM utxo WHERE outpoint = ?', deletes)
+                self.db.executemany('INSERT OR REPLACE INTO utxo VALUES (?, ?)', inserts)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+# rough per-entry overhead of a cached coin, on top of its script bytes
+CACHE_ENTRY_USAGE = 200
+
+
+class CacheEntry:
+    '''A cached coin, None once spent. dirty means the backend has to be
+    told about it, fresh means the backend has never seen it'''
+    __slots__ = ('coin', 'dirty', 'fresh')
+
+    def __init__(self, coin, dirty=False, fresh=False):
+        self.coin = coin
+        self.dirty = dirty
+        self.fresh = fresh
+
+
+class CoinsCache(CoinsView):
+    '''Write-back cache in front of another CoinsView. Changes stay in
+    memory until the estimated usage goes over budget (in bytes) or flush()
+    is called, then every dirty entry is written in one sorted batch.
+    Coins that are created and spent between two flushes never reach the
+    backend.'''
+
+    def __init__(self, base, budget=256 * 1024 * 1024):
+        self.base = base
+        self.budget = budget
+        self.entries = {}
+        self.usage = 0
+        self.hits = 0
+        self.misses = 0
+        # (number of entries written, seconds) for every flush
+        self.flushes = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def entry_usage(self, entry):
+        if entry.coin is None:
+            return CACHE_ENTRY_USAGE
+        return CACHE_ENTRY_USAGE + len(entry.coin.script_pubkey)
+
+    def put_entry(self, outpoint, entry):
+        old = self.entries.get(outpoint)
+        if old is not None:
+            self.usage -= self.entry_usage(old)
+        self.entries[outpoint] = entry
+        self.usage += self.entry_usage(entry)
+
+    def drop_entry(self, outpoint):
+        self.usage -= self.entry_usage(self.entries.pop(outpoint))
+
+    def get(self, outpoint):
+        entry = self.entries.get(outpoint)
+        if entry is not None:
+            self.hits += 1
+            return entry.coin
+        self.misses += 1
+        coin = self.base.get(outpoint)
+        if coin is not None:
+            self.put_entry(outpoint, CacheEntry(coin))
+        return coin
+
+    def batch_write(self, changes):
+        for outpoint, coin in changes.items():
+            entry = self.entries.get(outpoint)
+            if coin is None:
+                if entry is not None and entry.fresh:
+                    # the backend never saw it, so just forget it
+                    self.drop_entry(outpoint)
+                else:
+                    self.put_entry(outpoint, CacheEntry(None, dirty=True))
+            else:
+                # a new output the backend can't have, unless it's
+                # re-adding something the backend still has to delete
+                fresh = entry is None or entry.fresh
+                self.put_entry(outpoint, CacheEntry(coin, dirty=True, fresh=fresh))
+        if self.usage > self.budget:
+            self.flush()
+
+    def flush(self):
+        '''Writes every dirty entry to the backend and empties the cache'''
+        start = time.perf_counter()
+        changes = {
+            outpoint: entry.coin
+            for outpoint, entry in self.entries.items() if entry.dirty
+        }
+        if changes:
+            self.base.batch_write(changes)
+        self.entries = {}
+        self.usage = 0
+        self.flushes.append((len(changes), time.perf_counter() - start))
+
+    def stats(self):
+        '''Returns the cache counters and the flush timings'''
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'usage': self.usage,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'flushes': list(self.flushes),
+        }
+
+
+class UtxoPrevouts(PrevoutProvider):
+    '''PrevoutProvider backend reading from a CoinsView'''
+
+    def __init__(self, view):
+        self.view = view
+
+    def get(self, prev_tx, prev_index, testnet=False):
+        coin = self.view.get((prev_tx, prev_index))
+        if coin is None:
+            raise KeyError((prev_tx, prev_index))
+        return coin.tx_out()
@@ -0,0 +1,192 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from helper import (
+    COINBASE_MATURITY,
+    block_subsidy,
+)
+from prevout import DictPrevouts
+from undo import connect_block
+
+
+def check_tx_scripts(job):
+    '''Verifies every input of a transaction against its resolved previous
+    outputs. Returns None, or the index of the first bad input and the
+    error its scripts raised if any. Runs in the worker processes'''
+    tx, prevouts = job
+    for i in range(len(tx.tx_ins)):
+        try:
+            valid = tx.verify_input(i, prevouts=prevouts)
+        except Exception as e:
+            # a malformed script can fail with anything, an unknown
+            # opcode is a KeyError
+            return i, repr(e)
+        if not valid:
+            return i, None
+    return None
+
+
+class AssumeValid:
+    '''Knows which blocks are the trusted block or one of its ancestors.
+    parents maps a block hash to its prev_block for every header we have,
+    the walk back from the trusted hash is redone until it reaches genesis
+    '''
+
+    def __init__(self, block_hash, parents):
+        self.block_hash = block_hash
+        self.parents = parents
+        self.ancestors = set()
+        # where the last walk stopped for lack of a header
+        self.frontier = block_hash
+        self.complete = False
+
+    def walk(self):
+        current = self.frontier
+        while current in self.parents:
+            self.ancestors.add(current)
+            current = self.parents[current]
+        self.frontier = current
+        # the genesis block points at all zeroes
+        self.complete = current == b'\x00' * 32
+
+    def covers(self, block_hash):
+        '''Returns whether block_hash is the trusted block or an ancestor'''
+        if block_hash not in self.ancestors and not self.complete:
+            self.walk()
+        return block_hash in self.ancestors
+
+
+class BlockValidator:
+    '''Checks a whole block against a CoinsView and connects it.
+
+    Stages run in order: structure (coinbase, merkle root, proof of work),
+    resolve (inputs against the view and earlier transactions of the same
+    block, amounts and fees), scripts and connect. Resolving walks the
+    block in order, so once it's done every input has its previous output
+    and the script checks can run on a pool of worker processes in any
+    order. Nothing is written to the view unless every check passes.
+
+    With an AssumeValid, blocks it covers skip the script checks, every
+    other stage still runs.
+    '''
+
+    def __init__(self, view, workers=1, undo_store=None, check_pow=True, assume_valid=None):
+        self.view = view
+        self.workers = workers
+        self.undo_store = undo_store
+        self.check_pow = check_pow
+        self.assume_valid = assume_valid
+        self.executor = None
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def check_structure(self, block):
+        if not block.txs:
+            raise ValueError('block has no transactions')
+        if not block.txs[0].is_coinbase():
+            raise ValueError('first transaction is not a coinbase')
+        for tx in block.txs[1:]:
+            if tx.is_coinbase():
+                raise ValueError('more than one coinbase')
+        block.tx_hashes = [tx.hash() for tx in block.txs]
+        if not block.validate_merkle_root():
+            raise ValueError('bad merkle root')
+        if self.check_pow and not block.check_pow():
+            raise ValueError('bad proof of work')
+
+    def check_final(self, block, height, median_time_past):
+        for tx in block.txs:
+            if not tx.is_final(height, median_time_past):
+                raise ValueError('{} is locked until {}'.format(tx.id(), tx.locktime))
+
+    def resolve(self, block, height):
+        '''Returns the total fees and a (tx, DictPrevouts) job for every
+        non-coinbase transaction'''
+        # outputs created earlier in this block
+        created = {}
+        spent = set()
+        fees = 0
+        jobs = []
+        for tx in block.txs[1:]:
+            prevouts = DictPrevouts()
+            input_sum = 0
+            for tx_in in tx.tx_ins:
+                outpoint = (tx_in.prev_tx, tx_in.prev_index)
+                if outpoint in spent:
+                    raise ValueError('double spend of {}:{}'.format(
+                        tx_in.prev_tx.hex(), tx_in.prev_index))
+                spent.add(outpoint)
+                tx_out = created.get(outpoint)
+                if tx_out is None:
+                    coin = self.view.get(outpoint)
+                    if coin is None:
+                        raise ValueError('missing or spent input {}:{}'.format(
+                            tx_in.prev_tx.hex(), tx_in.prev_index))
+                    if coin.is_coinbase and height - coin.height < COINBASE_MATURITY:
+                        raise ValueError('immature coinbase spend {}:{}'.format(
+                            tx_in.prev_tx.hex(), tx_in.prev_index))
+                    tx_out = coin.tx_out()
+                prevouts.add(tx_in.prev_tx, tx_in.prev_index, tx_out)
+                input_sum += tx_out.amount
+            output_sum = sum(tx_out.amount for tx_out in tx.tx_outs)
+            if input_sum < output_sum:
+                raise ValueError('{} spends more than its inputs'.format(tx.id()))
+            fees += input_sum - output_sum
+            tx_hash = tx.hash()
+            for i, tx_out in enumerate(tx.tx_outs):
+                created[(tx_hash, i)] = tx_out
+            jobs.append((tx, prevouts))
+        coinbase_sum = sum(tx_out.amount for tx_out in block.txs[0].tx_outs)
+        if coinbase_sum > block_subsidy(height) + fees:
+            raise ValueError('coinbase pays {} but only {} is allowed'.format(
+                coinbase_sum, block_subsidy(height) + fees))
+        return fees, jobs
+
+    def check_scripts(self, jobs):
+        if self.executor is None:
+            results = map(check_tx_scripts, jobs)
+        else:
+            chunksize = max(1, len(jobs) // (self.workers * 4))
+            results = self.executor.map(check_tx_scripts, jobs, chunksize=chunksize)
+        for (tx, _), bad in zip(jobs, results):
+            if bad is not None:
+                bad_input, error = bad
+                message = 'bad script in {} input {}'.format(tx.id(), bad_input)
+                if error is not None:
+                    message += ': ' + error
+                raise ValueError(message)
+
+    def connect(self, block, height, median_time_past=None):
+        '''Validates block at height and applies it to the view. Returns a
+        report with the fees, the undo record, whether scripts were checked
+        and the seconds each stage took. Raises ValueError if the block is
+        invalid. Locktimes are checked when median_time_past, the one of
+        the parent's BlockIndexEntry, is given'''
+        timings = {}
+        start = time.perf_counter()
+        self.check_structure(block)
+        if median_time_past is not None:
+            self.check_final(block, height, median_time_past)
+        timings['structure'] = time.perf_counter() - start
+        start = time.perf_counter()
+        fees, jobs = self.resolve(block, height)
+        timings['resolve'] = time.perf_counter() - start
+        start = time.perf_counter()
+        scripts_checked = self.assume_valid is None or not self.assume_valid.covers(block.hash())
+        if scripts_checked:
+            self.check_scripts(jobs)
+        timings['scripts'] = time.perf_counter() - start
+        start = time.perf_counter()
+        undo = connect_block(self.view, block.txs, height, block.hash(), self.undo_store)
+        timings['connect'] = time.perf_counter() - start
+        return {
+            'fees': fees,
+            'undo': undo,
+            'scripts_checked': scripts_checked,
+            'timings': timings,
+        }